@@ -0,0 +1,318 @@
+import re
+import sys
+import bisect
+import time
+import random
+import logging
+from collections import namedtuple
+from db_pool import table_exists
+from reloading import ReloadingIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+def trie_pattern(words):
+    """
+    Compiles a list of words into one regex alternation shaped like a character trie.
+
+    Shared prefixes are factored out (e.g. "lecture hall" / "lecture halls" / "lecture hall complex"
+    become "lecture\\ hall(?:s|\\ complex)?"), so the engine walks the trie once per query position
+    instead of trying every alias in turn. Longer continuations are tried before shorter ones,
+    so the longest alias that also satisfies the surrounding word boundaries wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in node.items() if char != ""]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        # Branches start with distinct characters, so at most one can match; the greedy "?"
+        # makes the engine try the longer continuation before stopping at a shorter alias.
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if terminal else group
+
+    return build(trie)
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal-string-alignment distance (insertions, deletions, substitutions and adjacent
+    transpositions) between a and b, or max_distance + 1 as soon as it must exceed max_distance.
+    Only the diagonal band of width 2 * max_distance + 1 is computed.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    limit = max_distance + 1
+    previous2 = None
+    previous = [j if j <= max_distance else limit for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [limit] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return limit
+        previous2, previous = previous, current
+    return min(previous[-1], limit)
+
+
+def allowed_edits(length, max_edits):
+    """
+    Edits tolerated for an alias of `length` characters: none below 7, one from 7 and two from 11
+    (capped at max_edits). Shorter aliases ("lhc", "shops") are too close to ordinary words
+    ("shows", "stops") to be matched approximately.
+    """
+    return min(max_edits, max(0, (length - 3) // 4))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyAliasIndex:
+    """
+    Typo-tolerant alias lookup over a character-trigram inverted index.
+
+    Each alias is indexed by its padded trigrams. A query span only gets an edit-distance check
+    against aliases that share enough trigrams with it (one edit, counting a swap of adjacent
+    letters, destroys at most four trigrams),
+    so lookups touch a small candidate set even with thousands of aliases. An alias accepts at most
+    allowed_edits(len(alias), max_edits) edits, so aliases shorter than 7 characters must match
+    exactly, and numbers must match exactly ("phd hostel 7" is not "phd hostel 3").
+    """
+
+    def __init__(self, aliases, max_edits=2):
+        self.max_edits = max_edits
+        self.aliases = [alias for alias in aliases if allowed_edits(len(alias), max_edits) >= 1]
+        self.alias_trigrams = [trigrams(alias) for alias in self.aliases]
+        self.alias_numbers = [re.findall(r"\d+", alias) for alias in self.aliases]
+        # Posting lists are ordered by alias length so a lookup can slice out only the aliases
+        # whose length is within reach of the span: {gram: ([alias lengths], [alias ids])}
+        self.postings = {}
+        for alias_id in sorted(range(len(self.aliases)), key=lambda i: len(self.aliases[i])):
+            for gram in self.alias_trigrams[alias_id]:
+                lengths, ids = self.postings.setdefault(gram, ([], []))
+                lengths.append(len(self.aliases[alias_id]))
+                ids.append(alias_id)
+        self.max_words = max((len(alias.split()) for alias in self.aliases), default=0)
+        self.max_length = max((len(alias) for alias in self.aliases), default=0)
+
+    def lookup(self, span):
+        """Returns (distance, alias) for the closest alias within its allowed edits, or None."""
+        # Upper bound on the edits any alias close enough in length to this span may accept
+        max_edits = allowed_edits(len(span) + self.max_edits, self.max_edits)
+        if max_edits <= 0 or len(span) > self.max_length + max_edits:
+            return None
+
+        # Each edit changes at most 4 of the span's trigrams (a transposition touches 4, other edits 3),
+        # so any alias within max_edits shares at least one of any 4 * max_edits + 1 of them: only
+        # the rarest ones need to be scanned, and only for aliases of a compatible length.
+        grams = trigrams(span)
+        slices = []
+        for gram in grams:
+            lengths, ids = self.postings.get(gram, ((), ()))
+            lo = bisect.bisect_left(lengths, len(span) - max_edits)
+            hi = bisect.bisect_right(lengths, len(span) + max_edits)
+            slices.append((hi - lo, ids, lo, hi))
+        slices.sort(key=lambda item: item[0])
+        candidates = set()
+        for _, ids, lo, hi in slices[:4 * max_edits + 1]:
+            candidates.update(ids[lo:hi])
+
+        numbers = re.findall(r"\d+", span)
+        best = None
+        for alias_id in candidates:
+            alias = self.aliases[alias_id]
+            allowed = allowed_edits(len(alias), self.max_edits)
+            if abs(len(alias) - len(span)) > allowed or self.alias_numbers[alias_id] != numbers:
+                continue
+            alias_grams = self.alias_trigrams[alias_id]
+            if len(grams & alias_grams) < max(len(alias_grams), len(grams)) - 4 * allowed:
+                continue
+            if best is not None:
+                allowed = min(allowed, best[0] - 1)  # only a strictly closer alias can win now
+            distance = edit_distance(span, alias, allowed)
+            if distance <= allowed:
+                best = (distance, alias)
+        return best
+
+    def find_spans(self, query, covered=()):
+        """
+        Finds fuzzy alias matches among runs of up to max_words query words that don't overlap
+        the `covered` character ranges. Returns non-overlapping (start, end, alias) tuples,
+        preferring longer spans and then smaller distances.
+        """
+        words = [m for m in re.finditer(r"[\w'-]+", query)
+                 if not any(start < m.end() and m.start() < end for start, end in covered)]
+        candidates = []
+        for i in range(len(words)):
+            for j in range(i, min(i + self.max_words, len(words))):
+                # Only join words that are adjacent in the query (no covered text in between)
+                if j > i and query[words[j - 1].end():words[j].start()].strip():
+                    break
+                start, end = words[i].start(), words[j].end()
+                result = self.lookup(query[start:end])
+                if result is not None:
+                    candidates.append((-(end - start), result[0], start, end, result[1]))
+
+        chosen = []
+        for _, _, start, end, alias in sorted(candidates):
+            if not any(start < c_end and c_start < end for c_start, c_end, _ in chosen):
+                chosen.append((start, end, alias))
+        return chosen
+
+
+def load_aliases(conn):
+    """Reads the aliases table as an {alias: [building names]} mapping (lower-case aliases)."""
+    if not table_exists(conn, "aliases"):
+        logger.warning("'aliases' table not found.")
+        return {}
+    rows = conn.execute(
+        "SELECT b.name, a.name FROM buildings b JOIN aliases a ON b.id = a.building_id"
+    ).fetchall()
+    buildings_by_alias = {}
+    for building_name, alias_name in rows:
+        alias = alias_name.lower()
+        if alias and building_name not in buildings_by_alias.setdefault(alias, []):
+            buildings_by_alias[alias].append(building_name)
+    return buildings_by_alias
+
+
+# The alias map and the exact pattern and fuzzy index compiled from it, replaced as one object on
+# rebuild so a find() running on the worker pool never looks up a match in a newer alias map.
+MatcherState = namedtuple("MatcherState", ["buildings_by_alias", "pattern", "fuzzy"])
+
+
+class AliasMatcher(ReloadingIndex):
+    """
+    Finds building aliases in a query with a single precompiled regex built from the aliases table,
+    falling back to a FuzzyAliasIndex for words the exact pattern didn't match when it found fewer than
+    two buildings (max_edits=0 disables it).
+    The matcher is built once and rebuilt only when the database file changes on disk, from the
+    runtime snapshot when `snapshots` (a SnapshotCache) has a current one.
+    """
+
+    def __init__(self, database_file, max_edits=2, snapshots=None):
+        super().__init__(database_file)
+        self.max_edits = max_edits
+        self.snapshots = snapshots
+        self._state = MatcherState({}, None, None)
+
+    @property
+    def buildings_by_alias(self):
+        return self._state.buildings_by_alias
+
+    @property
+    def pattern(self):
+        return self._state.pattern
+
+    @property
+    def fuzzy(self):
+        return self._state.fuzzy
+
+    def reload(self):
+        snapshot = self.snapshots.get() if self.snapshots is not None else None
+        if snapshot is not None:
+            self.compile(snapshot.buildings_by_alias)
+        else:
+            super().reload()
+
+    def build(self, conn):
+        """Loads every (building, alias) pair and compiles the combined pattern."""
+        self.compile(load_aliases(conn))
+
+    def compile(self, buildings_by_alias):
+        """Compiles the exact pattern and the fuzzy index from an {alias: [building names]} mapping."""
+        pattern = re.compile(r"\b(?:" + trie_pattern(buildings_by_alias) + r")\b") if buildings_by_alias else None
+        fuzzy = FuzzyAliasIndex(buildings_by_alias, self.max_edits) if self.max_edits > 0 else None
+        self._state = MatcherState(buildings_by_alias, pattern, fuzzy)
+
+    def find(self, query):
+        """Returns building names mentioned in the query, in order of first appearance."""
+        self.ensure_fresh()
+        state = self._state
+        if state.pattern is None:
+            return []
+        lower_query = query.lower()
+        spans = [(m.start(), m.end(), m.group(0)) for m in state.pattern.finditer(lower_query)]
+        # A query names at most two buildings (a location or a route), so once the exact pass has
+        # found two the fuzzy pass, whose cost grows with the alias count, is skipped.
+        exact_buildings = {name for _, _, alias in spans for name in state.buildings_by_alias[alias]}
+        if state.fuzzy is not None and len(exact_buildings) < 2:
+            fuzzy_spans = state.fuzzy.find_spans(lower_query, covered=[(start, end) for start, end, _ in spans])
+            if fuzzy_spans:
+                spans = sorted(spans + fuzzy_spans)
+
+        found = []
+        for _, _, alias in spans:
+            for building_name in state.buildings_by_alias[alias]:
+                if building_name not in found:
+                    found.append(building_name)
+        return found
+
+
+# --- Benchmark ---
+def benchmark(sizes=(100, 1000, 5000, 10000), queries=200, seed=0):
+    """Times exact and fuzzy lookups as the alias set grows, using synthetic aliases."""
+    rng = random.Random(seed)
+    syllables = ["a", "na", "mu", "di", "pon", "su", "lai", "ma", "ni", "lib", "ra", "ry", "ga", "sth", "ya", "kat",
+                 "hi", "pa", "ve", "li", "tha", "ka", "ru", "van", "gi", "ri", "sha", "ko", "dai", "vel", "nee", "lam"]
+    suffixes = ["", " block", " hostel", " lab", " hall", " canteen"]
+
+    def make_alias():
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) + rng.choice(suffixes)
+
+    def typo(word):
+        i = rng.randrange(len(word))
+        return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + rng.choice("aeiou") + word[i:]
+
+    print(f"{'aliases':>8} {'build ms':>9} {'exact us':>9} {'fuzzy us':>9} {'fuzzy hit':>9}")
+    for size in sizes:
+        buildings_by_alias = {}
+        while len(buildings_by_alias) < size:
+            buildings_by_alias[make_alias()] = [f"Building {len(buildings_by_alias)}"]
+        aliases = list(buildings_by_alias)
+        matcher = AliasMatcher(None)
+        start = time.perf_counter()
+        matcher.compile(buildings_by_alias)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        exact_queries = [f"how do i get to {rng.choice(aliases)} from here" for _ in range(queries)]
+        typo_targets = [rng.choice([a for a in aliases if len(a) >= 8] or aliases) for _ in range(queries)]
+        typo_queries = [f"how do i get to {typo(target)} from here" for target in typo_targets]
+
+        start = time.perf_counter()
+        for q in exact_queries:
+            matcher.find(q)
+        exact_us = (time.perf_counter() - start) * 1e6 / queries
+        start = time.perf_counter()
+        hits = sum(buildings_by_alias[target][0] in matcher.find(q) for q, target in zip(typo_queries, typo_targets))
+        fuzzy_us = (time.perf_counter() - start) * 1e6 / queries
+        print(f"{size:>8} {build_ms:>9.1f} {exact_us:>9.1f} {fuzzy_us:>9.1f} {hits / queries:>9.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark()
+    else:
+        matcher = AliasMatcher(sys.argv[2] if len(sys.argv) > 2 else "campus.db")
+        for query in sys.argv[1:2] or ["where is the libary"]:
+            print(query, "->", matcher.find(query))
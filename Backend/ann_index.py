@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import numpy as np
+
+# --- IVF-Flat Approximate Nearest-Neighbour Index ---
+# Vectors are partitioned into `nlist` clusters with spherical k-means. A query only scores
+# the vectors in its `nprobe` closest clusters, so cost drops from O(N*d) to roughly
+# O((nlist + nprobe * N / nlist) * d). The index stores row ids, not vectors: it is attached
+# to a VectorIndex, which owns the normalised embedding matrix.
+
+
+def ann_index_path(database_file):
+    """Sidecar file the IVF index is persisted to, next to the database."""
+    return os.path.splitext(database_file)[0] + ".ivf.npz"
+
+
+class IVFIndex:
+    def __init__(self, centroids, ids, list_offsets, nprobe=4):
+        self.centroids = centroids      # (nlist, d) normalised cluster centres
+        self.ids = ids                  # knowledge_base row ids, grouped by cluster
+        self.list_offsets = list_offsets  # cluster c owns ids[list_offsets[c]:list_offsets[c + 1]]
+        self.nprobe = nprobe
+        self.positions = None           # ids mapped to rows of the attached matrix
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    # --- Building ---
+    @classmethod
+    def build(cls, matrix, ids, nlist=None, iterations=10, seed=0, nprobe=4):
+        """Clusters a normalised (n, d) matrix into an IVF index."""
+        n = matrix.shape[0]
+        if n == 0:
+            raise ValueError("Cannot build an IVF index over an empty knowledge base.")
+        nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(matrix @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, matrix)
+            counts = np.bincount(assignments, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty clusters so every list stays useful.
+            sums[empty] = matrix[rng.choice(n, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        assignments = np.argmax(matrix @ centroids.T, axis=1)
+
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        return cls(centroids, np.asarray(ids, dtype=np.int64)[order], list_offsets, nprobe=nprobe)
+
+    # --- Persistence ---
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, centroids=self.centroids, ids=self.ids, list_offsets=self.list_offsets)
+
+    @classmethod
+    def load(cls, path, nprobe=4):
+        with np.load(path) as data:
+            return cls(data["centroids"], data["ids"], data["list_offsets"], nprobe=nprobe)
+
+    # --- Querying ---
+    def attach(self, matrix_ids):
+        """
+        Maps the stored row ids onto rows of a VectorIndex matrix (whose ids are sorted).
+        Returns False if the index was built for a different set of rows and is stale.
+        """
+        if len(matrix_ids) != len(self.ids) or len(self.ids) == 0:
+            return False
+        positions = np.searchsorted(matrix_ids, self.ids)
+        positions = np.clip(positions, 0, len(matrix_ids) - 1)
+        if not np.array_equal(matrix_ids[positions], self.ids):
+            return False
+        self.positions = positions
+        return True
+
+    def search(self, matrix, query, top_k=3, nprobe=None):
+        """Returns (row positions, scores) of the approximate top_k rows for a normalised query."""
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probe = np.argpartition(centroid_scores, -nprobe)[-nprobe:]
+        else:
+            probe = np.arange(self.nlist)
+
+        candidates = np.concatenate([
+            self.positions[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe
+        ])
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = matrix[candidates] @ query
+        k = min(top_k, scores.shape[0])
+        best = np.argpartition(scores, -k)[-k:] if k < scores.shape[0] else np.arange(scores.shape[0])
+        best = best[np.argsort(scores[best])[::-1]]
+        return candidates[best], scores[best]
+
+
+def build_ann_index(conn, database_file, nlist=None, nprobe=4):
+    """Builds the IVF index for the current knowledge_base and persists it next to the database."""
+    from vector_index import VectorIndex
+
+    vector_index = VectorIndex(database_file)
+    vector_index.build(conn)
+    if len(vector_index.contents) == 0:
+        print("Knowledge base is empty; skipping ANN index build.")
+        return None
+    start = time.perf_counter()
+    index = IVFIndex.build(vector_index.matrix, vector_index.ids, nlist=nlist, nprobe=nprobe)
+    index.save(ann_index_path(database_file))
+    print(f"Built IVF index with {index.nlist} lists over {len(index.ids)} vectors in {time.perf_counter() - start:.2f} s.")
+    return index
+
+
+# --- Recall / Latency Evaluation ---
+def evaluate(database_file, k=10, nprobes=(1, 2, 4, 8, 16), queries=200, noise=0.05, seed=0):
+    """
+    Reports recall@k and mean query latency of the IVF index against exact search.
+    Queries are corpus vectors perturbed with Gaussian noise, so no external query set is needed.
+    """
+    from vector_index import VectorIndex, normalize_rows
+
+    conn = sqlite3.connect(database_file)
+    try:
+        exact = VectorIndex(database_file)
+        exact.build(conn)
+    finally:
+        conn.close()
+    if len(exact.contents) == 0:
+        print("Knowledge base is empty; nothing to evaluate.")
+        return []
+
+    index = IVFIndex.load(ann_index_path(database_file))
+    if not index.attach(exact.ids):
+        print("ANN index is stale; re-run ingest_data.py first.")
+        return []
+
+    rng = np.random.default_rng(seed)
+    sample = exact.matrix[rng.choice(len(exact.contents), min(queries, len(exact.contents)), replace=False)]
+    sample = normalize_rows(sample + rng.normal(scale=noise, size=sample.shape).astype(np.float32))
+    k = min(k, len(exact.contents))
+
+    start = time.perf_counter()
+    truth = []
+    for query in sample:
+        scores = exact.matrix @ query
+        truth.append(set(np.argpartition(scores, -k)[-k:].tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    print(f"{len(exact.contents)} vectors, {index.nlist} lists, {len(sample)} queries, k={k}")
+    print(f"{'method':>12} {'recall@k':>9} {'ms/query':>9}")
+    print(f"{'exact':>12} {1.0:>9.3f} {exact_ms:>9.3f}")
+    results = [{"method": "exact", "recall": 1.0, "ms_per_query": exact_ms}]
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        found = [index.search(exact.matrix, query, k, nprobe)[0] for query in sample]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(sample)
+        recall = np.mean([len(truth_set.intersection(f.tolist())) / k for truth_set, f in zip(truth, found)])
+        print(f"{'ivf/' + str(nprobe):>12} {recall:>9.3f} {elapsed_ms:>9.3f}")
+        results.append({"method": f"ivf/{nprobe}", "recall": float(recall), "ms_per_query": elapsed_ms})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or evaluate the IVF index for the knowledge base.")
+    parser.add_argument("command", choices=["build", "evaluate"])
+    parser.add_argument("--db", default="campus.db")
+    parser.add_argument("--nlist", type=int, default=None, help="Number of clusters (default: sqrt(N)).")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        conn = sqlite3.connect(args.db)
+        try:
+            build_ann_index(conn, args.db, nlist=args.nlist)
+        finally:
+            conn.close()
+    else:
+        if not os.path.exists(ann_index_path(args.db)):
+            sys.exit("No ANN index found; run 'python ann_index.py build' first.")
+        evaluate(args.db, k=args.k, nprobes=args.nprobe, queries=args.queries)
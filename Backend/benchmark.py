@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+
+# --- Offline Benchmark Suite ---
+# Generates synthetic campus databases (buildings, aliases, tags and a knowledge_base of N chunks
+# with embeddings and the FTS index), then times alias matching, knowledge retrieval and
+# end-to-end /api/query and /api/query/stream against each one with a deterministic fake Gemini.
+# Every size runs in its own process, so indexes, caches and peak memory are measured from a cold
+# start. Results are written as JSON and can be compared against a stored baseline to catch
+# scaling regressions.
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+CAMPUS_BOUNDS = ((8.676, 8.686), (77.130, 77.140))
+SYLLABLES = ["a", "na", "mu", "di", "pon", "su", "lai", "ma", "ni", "lib", "ra", "ry", "ga", "sth", "ya", "kat",
+             "hi", "pa", "ve", "li", "tha", "ka", "ru", "van", "gi", "ri", "sha", "ko", "dai", "vel", "nee", "lam"]
+SUFFIXES = ["block", "hostel", "lab", "hall", "canteen", "centre"]
+TAGS = ["academic", "hostel", "lab", "canteen", "sports", "office", "library", "shop"]
+
+# Metrics compared against the baseline: lower is better for all of them.
+COMPARED_METRICS = (
+    "alias_build_ms", "alias_match_p50_us", "alias_match_p95_us",
+    "index_build_ms", "retrieval_p50_ms", "retrieval_p95_ms",
+    "query_p50_ms", "query_p95_ms", "stream_p50_ms", "stream_p95_ms", "peak_rss_mb",
+)
+
+
+# --- Synthetic Data ---
+def building_count(chunks):
+    """Buildings grow with the corpus, from a small campus up to a city-sized map."""
+    return max(10, chunks // 100)
+
+
+def generate_database(path, chunks, dimension=768, seed=0, ann=False, snapshot=False):
+    """
+    Writes a synthetic campus.db with building_count(chunks) buildings and `chunks` knowledge rows,
+    plus the IVF index (ann=True) and the runtime snapshot (snapshot=True) as ingest would.
+    """
+    from ann_index import build_ann_index
+    from campus_db import create_tables, derive_aliases, upsert_buildings
+    from snapshot import build_snapshot
+    from embedding_store import create_knowledge_base_table, encode_embedding
+    from lexical_index import create_fts_table, rebuild_fts
+
+    rng = random.Random(seed)
+    vocabulary = sorted({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(5000)})
+
+    buildings = {}
+    while len(buildings) < building_count(chunks):
+        base = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        name = f"{base.title()} {rng.choice(SUFFIXES).title()} {len(buildings)}"
+        nickname = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + f" {len(buildings)}"
+        buildings[name] = {
+            "name": name,
+            "lat": rng.uniform(*CAMPUS_BOUNDS[0]),
+            "lng": rng.uniform(*CAMPUS_BOUNDS[1]),
+            "description": " ".join(rng.choice(vocabulary) for _ in range(30)),
+            "aliases": derive_aliases(name, [nickname]),
+            "tags": set(rng.sample(TAGS, 2)),
+        }
+
+    conn = sqlite3.connect(path)
+    try:
+        create_tables(conn)
+        upsert_buildings(conn, buildings)
+        create_knowledge_base_table(conn)
+        create_fts_table(conn)
+        vectors = np.random.default_rng(seed)
+        with conn:
+            for start in range(0, chunks, 10000):
+                count = min(10000, chunks - start)
+                block = vectors.standard_normal((count, dimension)).astype(np.float32)
+                rows = []
+                for i in range(count):
+                    words = rng.choices(vocabulary, k=rng.randint(12, 30))
+                    text = " ".join(words).capitalize() + "."
+                    rows.append((text, encode_embedding(block[i]), f"synthetic_{(start + i) // 1000}.txt", ((start + i) % 1000) * 200))
+                conn.executemany("INSERT INTO knowledge_base (content, embedding, source, chunk_offset) VALUES (?, ?, ?, ?)", rows)
+            rebuild_fts(conn)
+        if ann:
+            build_ann_index(conn, path)
+    finally:
+        conn.close()
+    if snapshot:
+        build_snapshot(path)
+    return list(buildings.values()), vocabulary
+
+
+def make_queries(buildings, vocabulary, count, seed=0):
+    """Deterministic query mix: exact and misspelt building mentions, routes, and questions without a building."""
+    rng = random.Random(seed + 1)
+
+    def alias(building):
+        return rng.choice(sorted(building["aliases"]))
+
+    def typo(word):
+        i = rng.randrange(len(word))
+        return word[:i] + word[i + 1:]
+
+    alias_queries, questions, requests = [], [], []
+    for i in range(count):
+        a, b = rng.sample(buildings, 2)
+        kind = i % 4
+        if kind == 0:
+            alias_queries.append(f"where is the {alias(a)}")
+        elif kind == 1:
+            alias_queries.append(f"how do i get from {alias(a)} to {alias(b)}")
+        elif kind == 2:
+            first, rest = a["name"].lower().split(" ", 1)
+            alias_queries.append(f"where is {typo(first)} {rest}")
+        else:
+            alias_queries.append("what are the " + " ".join(rng.sample(vocabulary, 3)))
+        questions.append("tell me about " + " ".join(rng.sample(vocabulary, 4)))
+        requests.append(alias_queries[-1] if kind != 3 else questions[-1])
+    return alias_queries, questions, requests
+
+
+# --- Measurement (runs in a fresh process per size) ---
+def percentile_summary(samples, scale, prefix, unit):
+    values = np.array(samples) * scale
+    return {f"{prefix}_p{q}_{unit}": float(np.percentile(values, q)) for q in (50, 95)}
+
+
+def measure(database_file, chunks, queries, dimension, seed, snapshot=False):
+    os.environ.update({
+        "DATABASE_FILE": database_file,
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "benchmark"),
+        "LOG_LEVEL": "WARNING",
+        # Caches off, so every request does the full amount of work
+        "RESPONSE_CACHE_DB": "",
+        "DESCRIPTION_CACHE_SIZE": "0",
+        "ANSWER_CACHE_SIZE": "0",
+    })
+    start = time.perf_counter()
+    ann = os.environ.get("KNOWLEDGE_INDEX_BACKEND") == "ivf"
+    buildings, vocabulary = generate_database(database_file, chunks, dimension, seed, ann=ann, snapshot=snapshot)
+    generate_seconds = time.perf_counter() - start
+
+    from embedding_pipeline import FakeGemini
+    from fastapi.testclient import TestClient
+    import main
+
+    fake = FakeGemini(embed_latency=0.0, generate_latency=0.0, dimension=dimension)
+    main.genai = fake  # stands in for the SDK module: only embed_content is used
+    main.model = fake
+    alias_queries, questions, requests = make_queries(buildings, vocabulary, queries, seed)
+
+    tenant = main.tenants.get()
+    start = time.perf_counter()
+    tenant.alias_matcher.ensure_fresh()
+    alias_build_ms = (time.perf_counter() - start) * 1000
+    alias_times = []
+    for query in alias_queries:
+        start = time.perf_counter()
+        main.find_mentioned_buildings_from_db(query)
+        alias_times.append(time.perf_counter() - start)
+
+    embeddings = [main.embed_query(question) for question in questions]
+    retrieval_times = []
+    with tenant.db_pool.connection() as conn:
+        start = time.perf_counter()
+        tenant.knowledge_index.ensure_fresh(conn)
+        index_build_ms = (time.perf_counter() - start) * 1000
+        for question, embedding in zip(questions, embeddings):
+            start = time.perf_counter()
+            main.find_relevant_knowledge(question, embedding, conn)
+            retrieval_times.append(time.perf_counter() - start)
+
+    query_times, stream_times = [], []
+    with TestClient(main.app) as client:
+        for query in requests[:3]:  # warm up the lazily built route graph and spatial index
+            client.post("/api/query", json={"query": query})
+        for query in requests:
+            start = time.perf_counter()
+            response = client.post("/api/query", json={"query": query})
+            query_times.append(time.perf_counter() - start)
+            response.raise_for_status()
+        for query in requests:
+            start = time.perf_counter()
+            response = client.post("/api/query/stream", json={"query": query})  # returns once the stream ends
+            stream_times.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    result = {
+        "chunks": chunks,
+        "buildings": len(buildings),
+        "aliases": sum(len(b["aliases"]) for b in buildings),
+        "generate_s": generate_seconds,
+        "database_mb": os.path.getsize(database_file) / 2 ** 20,
+        "alias_build_ms": alias_build_ms,
+        **percentile_summary(alias_times, 1e6, "alias_match", "us"),
+        "index_build_ms": index_build_ms,
+        "index_mb": tenant.knowledge_index.nbytes / 2 ** 20,
+        **percentile_summary(retrieval_times, 1e3, "retrieval", "ms"),
+        **percentile_summary(query_times, 1e3, "query", "ms"),
+        **percentile_summary(stream_times, 1e3, "stream", "ms"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return result
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+# --- Driver ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, queries, dimension, seed, backend, snapshot=False):
+    """Measures every size in a fresh process and returns the full results document."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="mapmycampus-bench-") as workdir:
+        for size in sizes:
+            database_file = os.path.join(workdir, f"bench_{size}.db")
+            env = {**os.environ, "KNOWLEDGE_INDEX_BACKEND": backend}
+            command = [sys.executable, os.path.abspath(__file__), "measure", "--size", str(size), "--db", database_file,
+                       "--queries", str(queries), "--dimension", str(dimension), "--seed", str(seed)] + (["--snapshot"] if snapshot else [])
+            process = subprocess.run(command, capture_output=True, text=True, env=env,
+                                     cwd=os.path.dirname(os.path.abspath(__file__)))
+            if process.returncode != 0:
+                sys.exit(f"Benchmark for {size} chunks failed:\n{process.stderr}")
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            results[str(size)] = result
+            print(f"{size:>8} chunks: alias p50 {result['alias_match_p50_us']:.0f} us, retrieval p50 {result['retrieval_p50_ms']:.2f} ms, "
+                  f"/api/query p50 {result['query_p50_ms']:.2f} ms, index build {result['index_build_ms']:.0f} ms, "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB")
+            for name in os.listdir(workdir):  # the database and its index / snapshot sidecars
+                os.remove(os.path.join(workdir, name))
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sqlite": sqlite3.sqlite_version,
+            "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+            "dimension": dimension,
+            "queries": queries,
+            "seed": seed,
+            "backend": backend,
+            "snapshot": snapshot,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance=0.5, min_delta=0.05):
+    """
+    Prints each metric against the baseline and returns the regressions: metrics that got more than
+    `tolerance` (fractionally) slower and by more than `min_delta` of the metric's unit, so
+    microsecond jitter on tiny timings is ignored.
+    """
+    regressions = []
+    print(f"{'chunks':>8} {'metric':>20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for size, result in current["results"].items():
+        base = baseline["results"].get(size)
+        if base is None:
+            print(f"{size:>8} (not in baseline)")
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in base or metric not in result:
+                continue
+            before, after = base[metric], result[metric]
+            change = (after - before) / before if before else 0.0
+            regressed = change > tolerance and after - before > min_delta
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{size:>8} {metric:>20} {before:>10.2f} {after:>10.2f} {change:>+8.0%}{flag}")
+            if regressed:
+                regressions.append((size, metric, before, after))
+    if current["meta"].get("machine") != baseline["meta"].get("machine"):
+        print(f"Note: baseline was recorded on '{baseline['meta'].get('machine')}'; timings may not be comparable.")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for alias matching, retrieval and /api/query.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the suite and write the results file.")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="knowledge_base sizes in chunks.")
+    run_parser.add_argument("--queries", type=int, default=200)
+    run_parser.add_argument("--dimension", type=int, default=768)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--backend", choices=["exact", "ivf"], default="exact")
+    run_parser.add_argument("--snapshot", action="store_true", help="Build the runtime snapshot, so indexes load from it.")
+    run_parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    run_parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Compare against this file if it exists.")
+    run_parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the new baseline.")
+    run_parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown before a metric counts as a regression.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare a results file against the baseline.")
+    compare_parser.add_argument("results", nargs="?", default=DEFAULT_OUTPUT)
+    compare_parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    compare_parser.add_argument("--tolerance", type=float, default=0.5)
+
+    measure_parser = subparsers.add_parser("measure", help=argparse.SUPPRESS)
+    measure_parser.add_argument("--size", type=int, required=True)
+    measure_parser.add_argument("--db", required=True)
+    measure_parser.add_argument("--queries", type=int, default=200)
+    measure_parser.add_argument("--dimension", type=int, default=768)
+    measure_parser.add_argument("--seed", type=int, default=0)
+    measure_parser.add_argument("--snapshot", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "measure":
+        result = measure(args.db, args.size, args.queries, args.dimension, args.seed, args.snapshot)
+        print(json.dumps(result))
+        sys.exit(0)
+
+    if args.command == "run":
+        current = run_suite(args.sizes, args.queries, args.dimension, args.seed, args.backend, args.snapshot)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {args.output}.")
+        if args.save_baseline:
+            with open(args.baseline, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+            print(f"Baseline saved to {args.baseline}.")
+            sys.exit(0)
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+            sys.exit(0)
+    else:
+        with open(args.results, "r", encoding="utf-8") as f:
+            current = json.load(f)
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.tolerance)
+    if regressions:
+        print(f"❌ {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}.")
+        sys.exit(1)
+    print("✅ No regressions against the baseline.")
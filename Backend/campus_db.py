@@ -1,226 +1,249 @@
-import sqlite3
+import os
 import re
+import csv
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from route_engine import create_path_tables, is_valid_coordinate
+from snapshot import build_snapshot, load_snapshot
+from tenants import tenant_paths
+
+DATABASE_FILE = 'campus.db'
+DEFAULT_SOURCES = [os.path.join('Data', 'buildings.csv')]
+
+
+# --- Schema ---
+def create_tables(conn):
+    """Creates the location tables (IF NOT EXISTS makes this safe to re-run)."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS buildings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        lat REAL NOT NULL,
+        lng REAL NOT NULL,
+        description TEXT
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS aliases (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        building_id INTEGER,
+        name TEXT NOT NULL,
+        FOREIGN KEY (building_id) REFERENCES buildings (id)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_aliases_name ON aliases (name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_aliases_building_id ON aliases (building_id)")
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS building_tags (
+        building_id INTEGER NOT NULL,
+        tag TEXT NOT NULL,
+        PRIMARY KEY (building_id, tag),
+        FOREIGN KEY (building_id) REFERENCES buildings (id)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_building_tags_tag ON building_tags (tag)")
+
+    # Footpath graph used for walking routes (populate with: python route_engine.py import-paths <file.geojson>)
+    create_path_tables(conn)
+
+
+# --- Source files ---
+def split_list(value):
+    """Aliases and tags are lists in GeoJSON and ';'-separated strings in CSV."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    return [item.strip() for item in value if item and item.strip()]
+
+
+def read_buildings_csv(path):
+    """Yields raw building records from a CSV with columns name, lat, lng, description, aliases, tags."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for line_number, row in enumerate(csv.DictReader(f), start=2):
+            yield f"{path}:{line_number}", row
+
+
+def read_buildings_geojson(path):
+    """Yields raw building records from the Point features of a GeoJSON FeatureCollection."""
+    with open(path, 'r', encoding='utf-8') as f:
+        features = json.load(f).get('features', [])
+    for index, feature in enumerate(features):
+        geometry = feature.get('geometry') or {}
+        properties = dict(feature.get('properties') or {})
+        if geometry.get('type') == 'Point':
+            coordinates = geometry.get('coordinates') or [None, None]
+            properties['lng'], properties['lat'] = coordinates[0], coordinates[1]
+        yield f"{path}#feature{index}", properties
+
+
+def read_building_files(paths):
+    """Streams raw records from every CSV / GeoJSON file, in order."""
+    for path in paths:
+        if path.lower().endswith(('.geojson', '.json')):
+            yield from read_buildings_geojson(path)
+        elif path.lower().endswith('.csv'):
+            yield from read_buildings_csv(path)
+        else:
+            raise ValueError(f"Unsupported building file '{path}' (expected .csv or .geojson).")
+
+
+def derive_aliases(name, aliases):
+    """The lower-cased aliases plus the full name and a simplified name ("physical sciences block" -> "physical sciences")."""
+    all_aliases = {alias.lower().strip() for alias in aliases}
+    all_aliases.add(name.lower().strip())
 
-# This is your BUILDINGS data, now with all buildings and expanded, factual descriptions.
-BUILDINGS = {
-    "Lecture Hall Complex": {
-        "lat": 8.683558103707359, "lng": 77.13498231455564, 
-        "description": "The Lecture Hall Complex, commonly known as the LHC, is the primary academic hub for undergraduate and postgraduate classes. It features numerous lecture halls of various sizes, seminar rooms, and is equipped with modern audio-visual facilities for teaching.", 
-        "aliases": ["lhc", "lecture halls", "lecture hall"]
-    },
-    "Physical Sciences Block": {
-        "lat": 8.682521262142819, "lng": 77.1350371685667, 
-        "description": "The Physical Sciences Block (PSB) houses the School of Physics. It contains faculty offices, advanced research laboratories for physics, and specialized equipment for experiments in various fields of physical science.", 
-        "aliases": ["psb", "physics block", "physical science"]
-    },
-    "Biological Science Block, IISER TVM": {
-        "lat": 8.681734690219086, "lng": 77.13735523514934, 
-        "description": "The Biological Science Block is the headquarters for the School of Biology. It includes faculty offices, research labs for genetics, molecular biology, and ecology, as well as teaching labs for students.", 
-        "aliases": ["bsb", "biology block", "biological science block", "dbs building"]
-    },
-    "Dept. of Chemical Sciences": {
-        "lat": 320.62, "lng": 172.92, 
-        "description": "The Department of Chemical Sciences building is the center for the School of Chemistry. It is equipped with state-of-the-art laboratories for organic, inorganic, physical, and theoretical chemistry research and teaching.", 
-        "aliases": ["chemistry department", "chem block"]
-    },
-    "Library": {
-        "lat": 8.681920078489515, "lng": 77.13392437090883, 
-        "description": "The Central Library provides access to a vast collection of scientific books, journals, and digital resources. It offers quiet study areas, computer access, and support services for students and researchers.", 
-        "aliases": ["iiser central library", "central library"]
-    },
-    "Animal House Block": {
-        "lat": 8.681480148391024, "lng": 77.13805260950807, 
-        "description": "The Animal House at IISER Thiruvananthapuram (IISER TVM) is a specialized facility designed to provide a controlled environment for the care and study of laboratory animals, particularly mice.It plays a crucial role in supporting research in biological sciences and related fields.", 
-        "aliases": ["animal house", "animal facility"]
-    },
-    "IISER TVM Health Centre": {
-        "lat": 8.683623824075873, "lng": 77.13245941243828, 
-        "description": "The Health Centre provides primary medical care, first aid, and emergency services to all students, faculty, and staff on campus. It is staffed by qualified medical professionals.", 
-        "aliases": ["health centre", "clinic", "hospital"]
-    },
-    "IISER TVM Shopping Centre": {
-        "lat": 8.684229939019572, "lng": 77.13272693062969, 
-        "description": "The Shopping Complex, often called ShopCom, houses several essential campus amenities, including a general store, eateries, and other student-run shops.", 
-        "aliases": ["Shopping Complex", "shopping centre", "shopcom", "shops"]
-    },
-    "Central Dining Hall": {
-        "lat": 347.53, "lng": 154.65, 
-        "description": "The Central Dining Hall (CDH) is the main mess facility for hostel residents, serving breakfast, lunch, and dinner. It features a large seating capacity and a central kitchen.", 
-        "aliases": ["cdh", "mess hall", "canteen"]
-    },
-    "Agasthya Hostel": {
-        "lat": 8.68007, "lng": 77.136576, 
-        "description": "Agasthya Hall of Residence is a permanent hostel building providing furnished accommodation primarily for male students at IISER Thiruvananthapuram.", 
-        "aliases": ["agasthya"]
-    },
-    "Ponmudi Hostel": {
-        "lat": 8.680537, "lng": 77.135906, 
-        "description": "Ponmudi Hostel is a permanent hall of residence for female students, managed by dedicated wardens from the faculty.", 
-        "aliases": ["ponmudi"]
-    },
-    "Visitors' Forest Retreat": {
-        "lat": 8.682448845793244, "lng": 77.13310263238871, 
-        "description": "The Visitors' Forest Retreat (VFR) serves as the campus guest house, providing comfortable accommodation for visiting faculty, conference attendees, and other official guests.", 
-        "aliases": ["forest retreat", "guest house"]
-    },
-    "IISER TVM Indoor Sports Complex": {
-        "lat": 8.678910683920078, "lng": 77.13498049288694, 
-        "description": "The Indoor Sports Complex features facilities for a variety of indoor games, including badminton, table tennis, and a gymnasium for fitness activities.", 
-        "aliases": ["indoor stadium", "sports complex"]
-    },
-    "Kathipara Stadium": {
-        "lat": 8.686787382058368, "lng": 77.13056895919277, 
-        "description": "Kathipara Stadium is the main outdoor sports facility on campus, featuring a full-size football ground and areas for athletic events.", 
-        "aliases": ["stadium", "football ground"]
-    },
-    "Poultry farm": {
-        "lat": 8.685457850899018, "lng": 77.13168742599625, 
-        "description": "The poultry farm is a research and utility facility, often associated with biological science studies or campus sustainability initiatives.", 
-        "aliases": ["poultry"]
-    },
-    "Thiruvananthapuram Central Railway Station": {
-        "lat": 8.486848364860853, "lng": 76.95214645256466, 
-        "description": "Thiruvananthapuram Central (TVC) is the primary railway station serving the city. It is a major hub for long-distance and local trains, located approximately 20-25 km from the IISER campus.", 
-        "aliases": ["railway station", "central station", "train station"]
-    },
-    "Thiruvananthapuram International Airport": {
-        "lat": 8.487130936935603, "lng": 76.92196659504725, 
-        "description": "Thiruvananthapuram International Airport (TRV) is the closest airport to the campus, serving both domestic and international flights. It is situated about 25-30 km from IISER.", 
-        "aliases": ["airport", "tvm airport"]
-    },
-    "I Cafe": {
-        "lat": 8.680665982054032, "lng": 77.13678688931871, 
-        "description": "I Cafe is a popular student-run eatery on campus, known for its snacks, beverages, and as a casual meeting spot.", 
-        "aliases": ["i-cafe", "i cafe"]
-    },
-    "MOBEL Lab": {
-        "lat": 8.682242857598077, "lng": 77.135774776028, 
-        "description": "The Molecular Biophysics and Engineering Laboratory (MOBEL) is a specialized research facility focused on interdisciplinary studies at the intersection of biology, physics, and engineering.", 
-        "aliases": ["mobel"]
-    },
-    "Central Instrumentation Facility Building": {
-        "lat": 8.682592851841207, "lng": 77.13745920333834, 
-        "description": "The Central Instrumentation Facility (CIF) houses a collection of high-end analytical instruments and equipment, providing sophisticated research support to all scientific departments on campus.", 
-        "aliases": ["cif", "central instrumentation"]
-    },
-    "Residence Block C1, IISER TVM": {
-        "lat": 8.685490511519728, "lng": 77.1264902852442, 
-        "description": "The C1 Residence Block, located in the Kattippara residential complex, provides furnished apartment-style housing for the faculty and staff of the institute.", 
-        "aliases": ["c1 quarters", "residence c1", "residence block", "faculty quarters", "faculty residence"]
-    },
-    "Director's Bungalow": {
-        "lat": 8.686551221770518, "lng": 77.12820691906941, 
-        "description": "This bungalow serves as the official on-campus residence for the Director of IISER Thiruvananthapuram.", 
-        "aliases": ["director bungalow"]
-    },
-    "Community centre": {
-        "lat": 8.687418795423712, "lng": 77.1308267544357, 
-        "description": "The Community Centre is a multi-purpose venue for campus events, student gatherings, and recreational activities.", 
-        "aliases": ["community hall"]
-    },
-    "IISER VITHURA Main gate": {
-        "lat": 8.67793969519614, "lng": 77.13334274182657, 
-        "description": "The main entrance and primary security checkpoint for the IISER campus in Vithura.", 
-        "aliases": ["main gate", "gate 1"]
-    },
-    "Sulaimani Canteen": {
-        "lat": 8.682507325369418, "lng": 77.13648746058396, 
-        "description": "Sulaimani Canteen is a popular campus eatery, well-known for serving tea, coffee, and a variety of local snacks.", 
-        "aliases": ["sulaimani"]
-    },
-    "Anamudi Block": {
-        "lat": 8.6786226797446, "lng": 77.13585451303928, 
-        "description": "Anamudi Block is a faculty residence. The A & D sections are for boys and are under the care of wardens Dr. Tanumoy Mandal (School of Physics) and Dr. Jerry Alfred Fereiro (School of Chemistry).", 
-        "aliases": ["anamudi", "anamudi block", "anamudi residence", "anamudi faculty housing"]
-    },
-    "Phd Hostel 3": {
-        "lat": 8.680282, "lng": 77.135699, 
-        "description": "This hostel block provides dedicated, furnished accommodation for PhD research scholars on campus.", 
-        "aliases": ["phd hostel 3", "phd hostel block 3"]
-    },
-    "Phd Hostel 4": {
-        "lat": 8.679845, "lng": 77.136356, 
-        "description": "This hostel block provides dedicated, furnished accommodation for PhD research scholars on campus.", 
-        "aliases": ["phd hostel 4", "phd hostel block 4"]
-    },
-    "Phd Hostel 5": {
-        "lat": 8.680004, "lng": 77.135479, 
-        "description": "This hostel block provides dedicated, furnished accommodation for PhD research scholars on campus.", 
-        "aliases": ["phd hostel 5", "phd hostel block 5"]
-    },
-    "Phd Hostel 6": {
-        "lat": 8.680009, "lng": 77.135463, 
-        "description": "This hostel block provides dedicated, furnished accommodation for PhD research scholars on campus.", 
-        "aliases": ["phd hostel 6", "phd hostel block 6"]
+    simplified_name = re.sub(r'\b(block|centre|complex|building|, iiser tvm)\b', '', name.lower(), flags=re.IGNORECASE).strip()
+    simplified_name = re.sub(r'\s+', ' ', simplified_name)
+    if simplified_name and simplified_name != name.lower().strip():
+        all_aliases.add(simplified_name)
+    all_aliases.discard('')
+    return all_aliases
+
+
+def validate_building(raw):
+    """Returns a clean building dict, or raises ValueError describing what is wrong with the record."""
+    name = (raw.get('name') or '').strip()
+    if not name:
+        raise ValueError("missing name")
+    try:
+        lat, lng = float(raw.get('lat')), float(raw.get('lng'))
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' has non-numeric coordinates ({raw.get('lat')!r}, {raw.get('lng')!r})")
+    return {
+        'name': name,
+        'lat': lat,
+        'lng': lng,
+        'description': (raw.get('description') or '').strip(),
+        'aliases': derive_aliases(name, split_list(raw.get('aliases'))),
+        'tags': {tag.lower() for tag in split_list(raw.get('tags'))},
+    }
+
+
+def load_buildings(records):
+    """
+    Validates raw records. Returns ({name: building}, [rejection messages], [unmapped messages]);
+    later duplicates win. Buildings whose coordinates aren't a valid latitude/longitude are kept,
+    so they still resolve by name, but the spatial index and route engine leave them out.
+    """
+    buildings, rejected, unmapped = {}, [], []
+    for location, raw in records:
+        try:
+            building = validate_building(raw)
+        except ValueError as e:
+            rejected.append(f"{location}: {e}")
+            continue
+        if not is_valid_coordinate(building['lat'], building['lng']):
+            unmapped.append(f"{location}: '{building['name']}' has out-of-range coordinates "
+                            f"({building['lat']}, {building['lng']}); expected latitude/longitude in degrees")
+        if building['name'] in buildings:
+            rejected.append(f"{location}: duplicate of '{building['name']}', replacing the earlier row")
+        buildings[building['name']] = building
+    return buildings, rejected, unmapped
+
+
+# --- Upsert ---
+def upsert_buildings(conn, buildings, prune=False):
+    """
+    Writes validated buildings in one transaction and returns a summary dict.
+
+    Existing rows are compared first, so only new or changed buildings are written (one
+    executemany per table) and an unchanged load leaves the database file untouched. With
+    prune=True, buildings missing from the input are deleted along with their aliases and tags.
+    """
+    existing = {name: (building_id, lat, lng, description or '')
+                for building_id, name, lat, lng, description in conn.execute("SELECT id, name, lat, lng, description FROM buildings")}
+    existing_aliases, existing_tags = {}, {}
+    for building_id, alias in conn.execute("SELECT building_id, name FROM aliases"):
+        existing_aliases.setdefault(building_id, set()).add(alias)
+    for building_id, tag in conn.execute("SELECT building_id, tag FROM building_tags"):
+        existing_tags.setdefault(building_id, set()).add(tag)
+
+    changed, inserted = [], 0
+    for name, building in buildings.items():
+        row = existing.get(name)
+        if row is None:
+            inserted += 1
+        elif (row[1:] == (building['lat'], building['lng'], building['description'])
+              and existing_aliases.get(row[0], set()) == building['aliases']
+              and existing_tags.get(row[0], set()) == building['tags']):
+            continue
+        changed.append(building)
+    removed = [row[0] for name, row in existing.items() if name not in buildings] if prune else []
+
+    if changed or removed:
+        with conn:
+            conn.executemany(
+                "INSERT INTO buildings (name, lat, lng, description) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET lat = excluded.lat, lng = excluded.lng, description = excluded.description",
+                [(b['name'], b['lat'], b['lng'], b['description']) for b in changed]
+            )
+            ids = dict(conn.execute("SELECT name, id FROM buildings"))
+            stale = [(ids[b['name']],) for b in changed] + [(building_id,) for building_id in removed]
+            conn.executemany("DELETE FROM aliases WHERE building_id = ?", stale)
+            conn.executemany("DELETE FROM building_tags WHERE building_id = ?", stale)
+            conn.executemany("DELETE FROM buildings WHERE id = ?", [(building_id,) for building_id in removed])
+            conn.executemany(
+                "INSERT INTO aliases (building_id, name) VALUES (?, ?)",
+                [(ids[b['name']], alias) for b in changed for alias in sorted(b['aliases'])]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO building_tags (building_id, tag) VALUES (?, ?)",
+                [(ids[b['name']], tag) for b in changed for tag in sorted(b['tags'])]
+            )
+
+    return {
+        "inserted": inserted,
+        "updated": len(changed) - inserted,
+        "unchanged": len(buildings) - len(changed),
+        "removed": len(removed),
     }
-}
-
-# Connect to the SQLite database
-conn = sqlite3.connect('campus.db')
-cursor = conn.cursor()
-
-# --- Create the tables (IF NOT EXISTS makes this script safe to re-run) ---
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS buildings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL UNIQUE,
-    lat REAL NOT NULL,
-    lng REAL NOT NULL,
-    description TEXT
-)
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS aliases (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    building_id INTEGER,
-    name TEXT NOT NULL,
-    FOREIGN KEY (building_id) REFERENCES buildings (id)
-)
-''')
-
-# --- Clear existing data to ensure a fresh build ---
-print("Clearing old data from 'buildings' and 'aliases' tables...")
-cursor.execute("DELETE FROM aliases")
-cursor.execute("DELETE FROM buildings")
-cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('buildings', 'aliases')")
-print("Old data cleared.")
-
-# --- Populate the tables ---
-print("Populating database...")
-for name, data in BUILDINGS.items():
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load buildings from CSV / GeoJSON files into campus.db.")
+    parser.add_argument("files", nargs="*", default=None, help="Building files (.csv or .geojson). Default: Data/buildings.csv")
+    parser.add_argument("--database", default=DATABASE_FILE, help="SQLite database to write (default: campus.db).")
+    parser.add_argument("--tenant", default=None,
+                        help="Load into tenants/<id>/campus.db (files default to tenants/<id>/Data/buildings.csv).")
+    parser.add_argument("--prune", action="store_true", help="Delete buildings that are not in the given files.")
+    parser.add_argument("--strict", action="store_true", help="Abort without writing anything if any record is invalid.")
+    args = parser.parse_args()
+    files = args.files or DEFAULT_SOURCES
+    if args.tenant:
+        args.database, data_dir = tenant_paths(os.getenv("TENANTS_DIR", "tenants"), args.tenant)
+        files = args.files or [os.path.join(data_dir, "buildings.csv")]
+        os.makedirs(os.path.dirname(args.database), exist_ok=True)
+
+    start = time.perf_counter()
+    buildings, rejected, unmapped = load_buildings(read_building_files(files))
+    for message in rejected:
+        print(f"Rejected {message}")
+    for message in unmapped:
+        print(f"Not mapped {message}")
+    if rejected and args.strict:
+        print(f"❌ {len(rejected)} invalid record(s); nothing was written (--strict).")
+        sys.exit(1)
+
+    conn = sqlite3.connect(args.database)
     try:
-        cursor.execute(
-            "INSERT INTO buildings (name, lat, lng, description) VALUES (?, ?, ?, ?)",
-            (name, data['lat'], data['lng'], data['description'])
-        )
-        building_id = cursor.lastrowid
-        
-        all_aliases = set()
-        
-        for alias in data.get('aliases', []):
-            all_aliases.add(alias.lower().strip())
-            
-        all_aliases.add(name.lower().strip())
-        
-        simplified_name = re.sub(r'\b(block|centre|complex|building|, iiser tvm)\b', '', name.lower(), flags=re.IGNORECASE).strip()
-        simplified_name = re.sub(r'\s+', ' ', simplified_name)
-        if simplified_name and simplified_name != name.lower().strip():
-            all_aliases.add(simplified_name)
-            
-        print(f" -> For '{name}', inserting aliases: {all_aliases}")
-        for alias in all_aliases:
-            if alias:
-                cursor.execute(
-                    "INSERT INTO aliases (building_id, name) VALUES (?, ?)",
-                    (building_id, alias)
-                )
-
-    except sqlite3.IntegrityError as e:
-        print(f"Error inserting '{name}': {e}. This might be due to a duplicate name.")
-
-# Commit the changes and close the connection
-conn.commit()
-conn.close()
-
-print("✅ Database 'campus.db' created and populated successfully!")
+        create_tables(conn)
+        conn.commit()
+        summary = upsert_buildings(conn, buildings, prune=args.prune)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {summary['inserted']}, updated {summary['updated']}, unchanged {summary['unchanged']}, "
+          f"removed {summary['removed']} buildings; rejected {len(rejected)} record(s) in {elapsed:.3f}s.")
+    if load_snapshot(args.database) is None:
+        print(f"Runtime snapshot written to {build_snapshot(args.database)}.")
+    print(f"✅ Database '{args.database}' created and populated successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import nltk
+
+# --- Chunking Strategies ---
+# A chunker turns a document into (start, end) character spans; the chunk text is always the
+# verbatim slice text[start:end], so every chunk can be traced back to its place in the source
+# file. Strategies trade chunk count (rows, embedding calls, scan time) against how much
+# context each embedding sees.
+
+STRATEGIES = ("sentence", "sentence-merge", "paragraph", "tokens")
+DEFAULT_SIZES = {"sentence-merge": 800, "paragraph": 2000, "tokens": 128}
+DEFAULT_OVERLAPS = {"tokens": 32}
+
+
+def sentence_spans(text):
+    """One span per sentence (NLTK punkt), located in the original text."""
+    spans = []
+    cursor = 0
+    for sentence in nltk.sent_tokenize(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        start = text.find(sentence, cursor)
+        if start == -1:
+            start = cursor
+        else:
+            cursor = start + len(sentence)
+        spans.append((start, start + len(sentence)))
+    return spans
+
+
+def merge_spans(spans, max_chars):
+    """Greedily joins consecutive spans while the merged span stays within max_chars."""
+    merged = []
+    for start, end in spans:
+        if merged and end - merged[-1][0] <= max_chars:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def paragraph_spans(text, max_chars):
+    """One span per blank-line separated paragraph; longer paragraphs are split into merged sentences."""
+    spans = []
+    for match in re.finditer(r"\S(?:.*?\S)?(?=\s*\n\s*\n|\s*$)", text, flags=re.DOTALL):
+        start, end = match.span()
+        if end - start <= max_chars:
+            spans.append((start, end))
+        else:
+            paragraph = text[start:end]
+            spans.extend((start + s, start + e) for s, e in merge_spans(sentence_spans(paragraph), max_chars))
+    return spans
+
+
+def token_window_spans(text, size, overlap):
+    """
+    Fixed windows of `size` whitespace-delimited tokens, each sharing `overlap` tokens with the
+    previous one so facts that straddle a boundary appear whole in at least one chunk.
+    """
+    tokens = [match.span() for match in re.finditer(r"\S+", text)]
+    step = max(1, size - overlap)
+    spans = []
+    for first in range(0, len(tokens), step):
+        last = min(first + size, len(tokens)) - 1
+        spans.append((tokens[first][0], tokens[last][1]))
+        if last == len(tokens) - 1:
+            break
+    return spans
+
+
+class Chunker:
+    """A chunking strategy plus its size limit (characters, or tokens for "tokens") and overlap."""
+
+    def __init__(self, strategy="sentence", size=None, overlap=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy '{strategy}'. Choose from: {', '.join(STRATEGIES)}.")
+        self.strategy = strategy
+        self.size = size if size is not None else DEFAULT_SIZES.get(strategy)
+        self.overlap = overlap if overlap is not None else DEFAULT_OVERLAPS.get(strategy, 0)
+        if self.size is not None and self.size <= 0:
+            raise ValueError("Chunk size must be positive.")
+        if strategy == "tokens" and not 0 <= self.overlap < self.size:
+            raise ValueError("Token overlap must be at least 0 and smaller than the window size.")
+
+    @property
+    def spec(self):
+        """Stable description of the configuration, stored with each ingested file's hash."""
+        if self.strategy == "sentence":
+            return "sentence"
+        if self.strategy == "tokens":
+            return f"tokens(size={self.size}, overlap={self.overlap})"
+        return f"{self.strategy}(size={self.size})"
+
+    def __str__(self):
+        return self.spec
+
+    def spans(self, text):
+        if self.strategy == "sentence":
+            return sentence_spans(text)
+        if self.strategy == "sentence-merge":
+            return merge_spans(sentence_spans(text), self.size)
+        if self.strategy == "paragraph":
+            return paragraph_spans(text, self.size)
+        return token_window_spans(text, self.size, self.overlap)
+
+
+# --- Benchmark ---
+def benchmark(path, chunkers, embedder, eval_path, k=3):
+    """
+    Ingests one file with each chunker into a throwaway in-memory database and reports chunk count,
+    index size, ingest time and retrieval quality (hit@k: the expected phrase appears in the top-k
+    chunks) for BM25, vector and hybrid retrieval over the questions in eval_path.
+    """
+    from embedding_pipeline import embed_chunks
+    from embedding_store import create_knowledge_base_table, encode_embedding
+    from lexical_index import create_fts_table, rebuild_fts, bm25_search, reciprocal_rank_fusion
+    from vector_index import VectorIndex
+
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    with open(eval_path, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    source = os.path.basename(path)
+    question_embeddings = embedder.embed([q["question"] for q in questions], task_type="RETRIEVAL_QUERY")
+
+    print(f"{source}: {len(text)} chars, {len(questions)} questions, hit@{k}")
+    print(f"{'chunker':>32} {'chunks':>7} {'index KiB':>10} {'ingest s':>9} {'bm25':>6} {'vector':>7} {'hybrid':>7} {'ctx chars':>10}")
+    results = []
+    for chunker in chunkers:
+        start = time.perf_counter()
+        spans = chunker.spans(text)
+        embeddings = embed_chunks([(f"Content from {source}", text[s:e]) for s, e in spans], embedder)
+        conn = sqlite3.connect(":memory:")
+        create_knowledge_base_table(conn)
+        create_fts_table(conn)
+        conn.executemany(
+            "INSERT INTO knowledge_base (content, embedding, source, chunk_offset) VALUES (?, ?, ?, ?)",
+            ((text[s:e], encode_embedding(embedding), source, s) for (s, e), embedding in zip(spans, embeddings))
+        )
+        rebuild_fts(conn)
+        vector_index = VectorIndex(":memory:")
+        vector_index.build(conn)
+        ingest_seconds = time.perf_counter() - start
+
+        hits = {"bm25": 0, "vector": 0, "hybrid": 0}
+        context_chars = 0
+        for question, query_embedding in zip(questions, question_embeddings):
+            lexical = bm25_search(conn, question["question"], 20)
+            vector = vector_index.search_with_ids(query_embedding, 20)
+            hybrid = reciprocal_rank_fusion([vector, lexical])
+            for name, ranking in (("bm25", lexical), ("vector", vector), ("hybrid", hybrid)):
+                top = [content for _, content, _ in ranking[:k]]
+                hits[name] += any(question["expect"].lower() in content.lower() for content in top)
+            context_chars += sum(len(content) for _, content, _ in hybrid[:k])
+        conn.close()
+
+        row = {
+            "chunker": chunker.spec,
+            "chunks": len(spans),
+            "index_bytes": vector_index.nbytes,
+            "ingest_seconds": ingest_seconds,
+            **{f"{name}_hit_rate": count / len(questions) for name, count in hits.items()},
+            "mean_context_chars": context_chars / len(questions),
+        }
+        results.append(row)
+        print(f"{row['chunker']:>32} {row['chunks']:>7} {row['index_bytes'] / 1024:>10.1f} {ingest_seconds:>9.2f} "
+              f"{row['bm25_hit_rate']:>6.2f} {row['vector_hit_rate']:>7.2f} {row['hybrid_hit_rate']:>7.2f} {row['mean_context_chars']:>10.0f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chunking strategies on a knowledge-base file.")
+    parser.add_argument("command", choices=["benchmark", "show"])
+    parser.add_argument("--file", default=os.path.join("Data", "IISER.txt"))
+    parser.add_argument("--eval", default=os.path.join("Data", "eval_questions.json"), help="JSON list of {question, expect}.")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="sentence", help="Chunker for 'show'.")
+    parser.add_argument("--size", type=int, default=None)
+    parser.add_argument("--overlap", type=int, default=None)
+    parser.add_argument("--embedder", choices=["fake", "gemini"], default="fake",
+                        help="'fake' runs offline, but its vector scores are meaningless; use 'gemini' to judge vector quality.")
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "show":
+        chunker = Chunker(args.strategy, args.size, args.overlap)
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+        for start, end in chunker.spans(text):
+            print(f"[{start}:{end}] {text[start:end]}\n")
+    else:
+        from dotenv import load_dotenv
+        from embedding_pipeline import FakeEmbedder, GeminiEmbedder
+
+        load_dotenv()
+        embedder = GeminiEmbedder() if args.embedder == "gemini" else FakeEmbedder()
+        chunkers = [
+            Chunker("sentence"),
+            Chunker("sentence-merge", 400),
+            Chunker("sentence-merge", 800),
+            Chunker("paragraph"),
+            Chunker("tokens", 64, 16),
+            Chunker("tokens", 128, 32),
+            Chunker("tokens", 256, 64),
+        ]
+        benchmark(args.file, chunkers, embedder, args.eval, k=args.k)
@@ -0,0 +1,88 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+def table_exists(conn, table_name):
+    """True if the database has a table (or virtual table) named table_name."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone() is not None
+
+
+class ConnectionPool:
+    """
+    A small pool of reusable SQLite connections shared by worker threads.
+
+    Connections are opened lazily up to `size` and handed out one caller at a time; when all are
+    busy, callers wait up to `timeout` seconds for one to be returned. Reusing connections avoids
+    paying for sqlite3.connect (and the schema parse) on every request. After close(), connections
+    still borrowed are closed as they come back instead of returning to the pool.
+    """
+
+    def __init__(self, database_file, size=8, timeout=10.0):
+        self.database_file = database_file
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.database_file, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection became available within {self.timeout}s.")
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection for the duration of the with-block."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                closed = self._closed
+                if closed:
+                    self._created -= 1
+                else:
+                    self._idle.put(conn)
+            if closed:
+                conn.close()
+
+    def close(self):
+        """Closes every idle connection and marks the pool closed, so borrowed ones are closed on return."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
@@ -0,0 +1,156 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+from collections import namedtuple
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+# --- Embedding Clients ---
+class GeminiEmbedder:
+    """Embeds batches of texts with the Gemini embedding API."""
+
+    def __init__(self, model=EMBEDDING_MODEL, api_key=None):
+        import google.generativeai as genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables. Please set it in your .env file.")
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.model = model
+
+    def embed(self, texts, task_type="RETRIEVAL_DOCUMENT", title=None):
+        kwargs = {"title": title} if title and task_type == "RETRIEVAL_DOCUMENT" else {}
+        result = self._genai.embed_content(model=self.model, content=list(texts), task_type=task_type, **kwargs)
+        return result['embedding']
+
+
+class FakeEmbedder:
+    """
+    Deterministic, offline stand-in for GeminiEmbedder used by tests and benchmarks.
+    The same text always maps to the same unit vector; `latency` simulates a network round trip.
+    """
+
+    def __init__(self, dimension=768, latency=0.0):
+        self.dimension = dimension
+        self.latency = latency
+
+    def embed(self, texts, task_type="RETRIEVAL_DOCUMENT", title=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.embed_one(text).tolist() for text in texts]
+
+    def embed_one(self, text):
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+FakeResponse = namedtuple("FakeResponse", ["text"])
+
+
+class FakeGemini:
+    """
+    Offline stand-in for the google.generativeai module and its GenerativeModel, used by the load
+    test and benchmarks. embed_content blocks for embed_latency (like the synchronous SDK) and
+    returns FakeEmbedder vectors; generate_content_async awaits generate_latency. With stream=True
+    it returns an async iterator of chunks spread over generate_latency, like the SDK's streamed
+    response.
+    """
+
+    ANSWER = "This is a fake answer from the offline Gemini stand-in."
+
+    def __init__(self, embed_latency=0.0, generate_latency=0.0, dimension=768):
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.embedder = FakeEmbedder(dimension=dimension)
+
+    def embed_content(self, model, content, task_type=None, **kwargs):
+        if self.embed_latency:
+            time.sleep(self.embed_latency)
+        if isinstance(content, str):
+            return {"embedding": self.embedder.embed_one(content).tolist()}
+        return {"embedding": self.embedder.embed(content)}
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        if stream:
+            return self._stream()
+        await asyncio.sleep(self.generate_latency)
+        return FakeResponse(self.ANSWER)
+
+    async def _stream(self):
+        words = self.ANSWER.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.generate_latency / len(words))
+            yield FakeResponse(word if i == len(words) - 1 else word + " ")
+
+
+class EmbeddingError(Exception):
+    """Raised when some batches still fail after all retries."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"{len(failures)} embedding batch(es) failed after retries: {failures[0][1]}")
+
+
+# --- Batched, Concurrent Pipeline ---
+def _embed_with_retry(embedder, texts, title, max_retries, backoff):
+    for attempt in range(max_retries + 1):
+        try:
+            embeddings = embedder.embed(texts, task_type="RETRIEVAL_DOCUMENT", title=title)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}.")
+            return embeddings
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            print(f"  - Embedding batch failed ({e}); retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+def embed_chunks(chunks, embedder, batch_size=100, max_concurrency=4, max_retries=5, backoff=1.0):
+    """
+    Embeds a list of (title, text) chunks and returns their embeddings in the same order.
+
+    Chunks are grouped into multi-content requests of up to `batch_size` texts sharing a title,
+    at most `max_concurrency` batches are in flight at once, and each batch is retried with
+    exponential backoff. If any batch still fails, EmbeddingError is raised so no chunk is
+    dropped silently.
+    """
+    batches = []
+    start = 0
+    while start < len(chunks):
+        title = chunks[start][0]
+        end = start
+        while end < len(chunks) and end - start < batch_size and chunks[end][0] == title:
+            end += 1
+        batches.append((start, end, title))
+        start = end
+
+    embeddings = [None] * len(chunks)
+    failures = []
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(_embed_with_retry, embedder, [text for _, text in chunks[s:e]], title, max_retries, backoff): (s, e)
+            for s, e, title in batches
+        }
+        for future in as_completed(futures):
+            s, e = futures[future]
+            try:
+                embeddings[s:e] = future.result()
+            except Exception as e_:
+                failures.append(((s, e), e_))
+    elapsed = time.perf_counter() - begin
+
+    if failures:
+        raise EmbeddingError(failures)
+    rate = len(chunks) / elapsed if elapsed > 0 else float("inf")
+    print(f"Embedded {len(chunks)} chunks in {len(batches)} batches in {elapsed:.2f}s ({rate:.1f} chunks/s).")
+    return embeddings
@@ -0,0 +1,124 @@
+import sqlite3
+import struct
+import json
+import sys
+import numpy as np
+
+# --- Binary Embedding Format ---
+# Each embedding is stored as a BLOB: a 4-byte header followed by little-endian float32 values.
+#   byte 0   : format version (EMBEDDING_FORMAT_VERSION)
+#   byte 1   : reserved (0)
+#   bytes 2-3: dimension as little-endian uint16
+# The header keeps the payload 4-byte aligned so a run of blobs can be viewed as one matrix.
+EMBEDDING_FORMAT_VERSION = 1
+HEADER = struct.Struct("<BxH")
+HEADER_SIZE = HEADER.size
+
+
+def encode_embedding(embedding):
+    """Packs an embedding (list or array of floats) into the versioned float32 BLOB format."""
+    vector = np.asarray(embedding, dtype="<f4")
+    return HEADER.pack(EMBEDDING_FORMAT_VERSION, vector.shape[0]) + vector.tobytes()
+
+
+def decode_embedding(blob):
+    """Unpacks a single BLOB back into a float32 array (a view over the blob, no copy)."""
+    version, dimension = HEADER.unpack_from(blob)
+    if version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version {version}.")
+    return np.frombuffer(blob, dtype="<f4", count=dimension, offset=HEADER_SIZE)
+
+
+def blobs_to_matrix(blobs):
+    """
+    Views a sequence of equally sized embedding BLOBs as an (n, d) float32 matrix.
+    The blobs are joined once and the header bytes are skipped with a structured dtype,
+    so no row is decoded individually.
+    """
+    if not blobs:
+        return np.empty((0, 0), dtype=np.float32)
+    version, dimension = HEADER.unpack_from(blobs[0])
+    if version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version {version}.")
+    record = np.dtype([("header", f"V{HEADER_SIZE}"), ("vector", "<f4", (dimension,))])
+    buffer = b"".join(blobs)
+    if len(buffer) != record.itemsize * len(blobs):
+        raise ValueError("knowledge_base contains embeddings of mixed dimensions.")
+    return np.frombuffer(buffer, dtype=record)["vector"]
+
+
+# --- Schema Helpers ---
+# Provenance columns used by incremental ingestion; older tables gain them via ALTER TABLE.
+CHUNK_COLUMNS = {"source": "TEXT", "chunk_offset": "INTEGER", "content_hash": "TEXT"}
+
+
+def create_knowledge_base_table(conn):
+    """Creates the knowledge_base and knowledge_sources tables if they don't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS knowledge_base (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            source TEXT,
+            chunk_offset INTEGER,
+            content_hash TEXT
+        );
+    """)
+    existing = {column[1] for column in conn.execute("PRAGMA table_info(knowledge_base)")}
+    for name, declared_type in CHUNK_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE knowledge_base ADD COLUMN {name} {declared_type}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_base_source ON knowledge_base (source)")
+    # One row per ingested file, so unchanged files can be skipped without re-chunking them.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS knowledge_sources (
+            source TEXT PRIMARY KEY,
+            file_hash TEXT NOT NULL
+        );
+    """)
+
+
+def is_legacy_format(conn):
+    """True if knowledge_base still stores embeddings as JSON text."""
+    for column in conn.execute("PRAGMA table_info(knowledge_base)"):
+        if column[1] == "embedding":
+            return column[2].upper() == "TEXT"
+    return False
+
+
+# --- Migration ---
+def migrate_knowledge_base(conn):
+    """
+    One-shot migration of JSON-encoded embeddings to the binary BLOB format.
+    Rebuilds the table in a single transaction, keeping row ids. Returns the number of rows migrated.
+    """
+    if not is_legacy_format(conn):
+        print("knowledge_base already uses the binary embedding format.")
+        return 0
+
+    rows = conn.execute("SELECT id, content, embedding FROM knowledge_base ORDER BY id").fetchall()
+    conn.execute("BEGIN")
+    try:
+        conn.execute("ALTER TABLE knowledge_base RENAME TO knowledge_base_legacy")
+        create_knowledge_base_table(conn)
+        conn.executemany(
+            "INSERT INTO knowledge_base (id, content, embedding) VALUES (?, ?, ?)",
+            ((row[0], row[1], encode_embedding(json.loads(row[2]))) for row in rows)
+        )
+        conn.execute("DROP TABLE knowledge_base_legacy")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    conn.execute("VACUUM")
+    print(f"Migrated {len(rows)} embeddings to the binary format.")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    database_file = sys.argv[1] if len(sys.argv) > 1 else "campus.db"
+    conn = sqlite3.connect(database_file)
+    try:
+        migrate_knowledge_base(conn)
+    finally:
+        conn.close()
@@ -1,17 +1,22 @@
 import sqlite3
 import os
-import google.generativeai as genai
+import time
+import hashlib
+import argparse
+from collections import namedtuple
 from dotenv import load_dotenv
-import json
 import nltk
+from embedding_store import create_knowledge_base_table, encode_embedding, is_legacy_format, migrate_knowledge_base
+from embedding_pipeline import GeminiEmbedder, EmbeddingError, embed_chunks
+from ann_index import build_ann_index
+from snapshot import build_snapshot, load_snapshot
+from lexical_index import create_fts_table, rebuild_fts
+from chunkers import Chunker, STRATEGIES
+from tenants import tenant_paths
 
 # --- Configuration ---
 load_dotenv()
-# Make sure to set your GEMINI_API_KEY in a .env file
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not gemini_api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables. Please set it in your .env file.")
-genai.configure(api_key=gemini_api_key)
+# Make sure to set your GEMINI_API_KEY in a .env file (read by GeminiEmbedder)
 
 DATABASE_FILE = "campus.db"
 DATA_DIR = "Data"
@@ -33,70 +38,189 @@ def setup_nltk():
             print(f"Download of '{resource_name}' complete.")
 
 
-def create_knowledge_base_table(conn):
-    """Creates the knowledge_base table if it doesn't exist."""
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS knowledge_base (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            content TEXT NOT NULL,
-            embedding TEXT NOT NULL
-        );
-    """)
-    print("Table 'knowledge_base' is ready.")
-
-def ingest_data():
-    """Reads data, chunks it by sentence, creates embeddings, and stores them in the database."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    create_knowledge_base_table(conn)
-    
-    # Clear old data to prevent duplicates on re-runs
-    conn.execute("DELETE FROM knowledge_base")
-    print("Cleared old data from knowledge_base.")
+Chunk = namedtuple("Chunk", ["source", "offset", "text", "content_hash"])
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def read_sources(data_dir=DATA_DIR):
+    """Returns {filename: text} for every .txt file in data_dir."""
+    sources = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                sources[filename] = f.read()
+    return sources
+
+def source_hash(text, chunker):
+    """Per-file hash stored in knowledge_sources; includes the chunker so changing it re-chunks every file."""
+    return content_hash(f"{chunker.spec}\x00{text}")
+
+def split_into_chunks(source, text, chunker):
+    """Splits a file into chunks with the given chunker, recording each chunk's character offset in the file."""
+    return [Chunk(source, start, text[start:end], content_hash(text[start:end])) for start, end in chunker.spans(text)]
+
+def embed(chunks, embedder, batch_size, max_concurrency):
+    return embed_chunks(
+        [(f"Content from {chunk.source}", chunk.text) for chunk in chunks],
+        embedder, batch_size=batch_size, max_concurrency=max_concurrency
+    )
+
+def plan_incremental(conn, sources, chunker):
+    """
+    Diffs the source files against what is stored, using per-file and per-chunk content hashes.
+    Returns (inserts, updates, moves, deletes, unchanged):
+      inserts  - new chunks to embed and insert
+      updates  - (row id, chunk) pairs whose text changed at the same offset
+      moves    - (row id, new offset) for unchanged text that shifted within its file
+      deletes  - row ids whose text no longer exists
+    """
+    stored_files = dict(conn.execute("SELECT source, file_hash FROM knowledge_sources"))
+    stored_sources = {row[0] for row in conn.execute("SELECT DISTINCT source FROM knowledge_base")}
+    inserts, updates, moves, deletes = [], [], [], []
+    unchanged = 0
+
+    # Rows from deleted files (or legacy rows without provenance) are removed
+    for source in stored_sources:
+        if source is None or source not in sources:
+            if source is None:
+                rows = conn.execute("SELECT id FROM knowledge_base WHERE source IS NULL")
+            else:
+                rows = conn.execute("SELECT id FROM knowledge_base WHERE source = ?", (source,))
+            deletes.extend(row[0] for row in rows)
+
+    for source, text in sources.items():
+        if stored_files.get(source) == source_hash(text, chunker) and source in stored_sources:
+            unchanged += conn.execute("SELECT COUNT(*) FROM knowledge_base WHERE source = ?", (source,)).fetchone()[0]
+            continue
+
+        by_hash = {}
+        for row_id, offset, chunk_hash in conn.execute(
+            "SELECT id, chunk_offset, content_hash FROM knowledge_base WHERE source = ? ORDER BY chunk_offset", (source,)
+        ):
+            by_hash.setdefault(chunk_hash, []).append((row_id, offset))
 
+        # First pass: keep every chunk whose text is already stored, wherever it moved to
+        pending = []
+        for chunk in split_into_chunks(source, text, chunker):
+            matches = by_hash.get(chunk.content_hash)
+            if matches:
+                row_id, offset = matches.pop(0)
+                unchanged += 1
+                if offset != chunk.offset:
+                    moves.append((row_id, chunk.offset))
+            else:
+                pending.append(chunk)
+
+        # Second pass: changed text at an old chunk's offset updates that row; the rest are new
+        leftover = {offset: row_id for rows in by_hash.values() for row_id, offset in rows}
+        for chunk in pending:
+            row_id = leftover.pop(chunk.offset, None)
+            if row_id is None:
+                inserts.append(chunk)
+            else:
+                updates.append((row_id, chunk))
+        deletes.extend(leftover.values())
+
+    return inserts, updates, moves, deletes, unchanged
+
+def ingest_data(embedder=None, incremental=False, batch_size=100, max_concurrency=4, chunker=None,
+                database_file=DATABASE_FILE, data_dir=DATA_DIR):
+    """
+    Reads data, chunks it (by sentence unless another Chunker is given), creates embeddings in batches,
+    and stores them in the database.
+    With incremental=True only new or changed chunks are embedded and rows for deleted text are removed.
+    """
     # Ensure the Data directory exists
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-        print(f"Created directory {DATA_DIR}. Please add your .txt files there.")
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+        print(f"Created directory {data_dir}. Please add your .txt files there.")
         return
 
-    for filename in os.listdir(DATA_DIR):
-        if filename.endswith(".txt"):
-            filepath = os.path.join(DATA_DIR, filename)
-            print(f"Processing {filepath}...")
-            with open(filepath, 'r', encoding='utf-8') as f:
-                text = f.read()
-                # Chunking by sentence instead of paragraph
-                chunks = nltk.sent_tokenize(text)
-                
-                for chunk in chunks:
-                    chunk = chunk.strip()
-                    if not chunk:
-                        continue
-                    
-                    # Use the embedding model
-                    try:
-                        result = genai.embed_content(
-                            model="models/text-embedding-004",
-                            content=chunk,
-                            task_type="RETRIEVAL_DOCUMENT",
-                            title=f"Content from {filename}" # Optional: Add a title for better embeddings
-                        )
-                        embedding = result['embedding']
-                        
-                        # Store embedding as a JSON string
-                        conn.execute(
-                            "INSERT INTO knowledge_base (content, embedding) VALUES (?, ?)",
-                            (chunk, json.dumps(embedding))
-                        )
-                        print(f"  - Embedded and stored sentence: '{chunk[:60]}...'")
-                        
-                    except Exception as e:
-                        print(f"Error embedding chunk: {e}")
-
-    conn.commit()
-    conn.close()
-    print("\nData ingestion complete. Your knowledge base is updated with sentence-level chunks.")
+    chunker = chunker or Chunker()
+    conn = sqlite3.connect(database_file)
+    try:
+        if is_legacy_format(conn):
+            migrate_knowledge_base(conn)
+        create_knowledge_base_table(conn)
+        if create_fts_table(conn):
+            rebuild_fts(conn)  # Backfill the full-text index for rows ingested before it existed
+        conn.commit()
+        print("Table 'knowledge_base' is ready.")
+
+        start = time.perf_counter()
+        sources = read_sources(data_dir)
+        if incremental:
+            inserts, updates, moves, deletes, unchanged = plan_incremental(conn, sources, chunker)
+        else:
+            inserts = [chunk for source, text in sources.items() for chunk in split_into_chunks(source, text, chunker)]
+            updates, moves, unchanged = [], [], 0
+            deletes = None  # Full rebuild: every existing row is replaced
+
+        hashes_current = dict(conn.execute("SELECT source, file_hash FROM knowledge_sources")) == {
+            source: source_hash(text, chunker) for source, text in sources.items()
+        }
+        if incremental and not (inserts or updates or moves or deletes) and hashes_current:
+            print(f"Knowledge base is up to date ({unchanged} chunks unchanged) in {(time.perf_counter() - start) * 1000:.1f} ms.")
+            if load_snapshot(database_file) is None:
+                print(f"Runtime snapshot written to {build_snapshot(database_file)}.")
+            return
+
+        to_embed = inserts + [chunk for _, chunk in updates]
+        try:
+            embeddings = embed(to_embed, embedder or GeminiEmbedder(), batch_size, max_concurrency) if to_embed else []
+        except EmbeddingError as e:
+            print(f"Error embedding chunks: {e}. The existing knowledge base was left unchanged.")
+            return
+        inserted = list(zip(inserts, embeddings[:len(inserts)]))
+        updated = list(zip(updates, embeddings[len(inserts):]))
+
+        # Apply every change in a single transaction
+        with conn:
+            if deletes is None:
+                conn.execute("DELETE FROM knowledge_base")
+                conn.execute("DELETE FROM knowledge_sources")
+            else:
+                conn.executemany("DELETE FROM knowledge_base WHERE id = ?", ((row_id,) for row_id in deletes))
+                conn.execute("DELETE FROM knowledge_sources")
+            conn.executemany(
+                "UPDATE knowledge_base SET content = ?, embedding = ?, chunk_offset = ?, content_hash = ? WHERE id = ?",
+                ((chunk.text, encode_embedding(embedding), chunk.offset, chunk.content_hash, row_id)
+                 for (row_id, chunk), embedding in updated)
+            )
+            conn.executemany("UPDATE knowledge_base SET chunk_offset = ? WHERE id = ?", ((offset, row_id) for row_id, offset in moves))
+            conn.executemany(
+                "INSERT INTO knowledge_base (content, embedding, source, chunk_offset, content_hash) VALUES (?, ?, ?, ?, ?)",
+                ((chunk.text, encode_embedding(embedding), chunk.source, chunk.offset, chunk.content_hash)
+                 for chunk, embedding in inserted)
+            )
+            conn.executemany(
+                "INSERT INTO knowledge_sources (source, file_hash) VALUES (?, ?)",
+                ((source, source_hash(text, chunker)) for source, text in sources.items())
+            )
+            # Keep the BM25 index in step with knowledge_base, in the same transaction
+            rebuild_fts(conn)
+        elapsed = time.perf_counter() - start
+        removed = len(deletes) if deletes is not None else 0
+        print(f"Added {len(inserted)}, updated {len(updated)}, removed {removed}, unchanged {unchanged} chunks in {elapsed:.2f}s.")
+
+        build_ann_index(conn, database_file)
+    finally:
+        conn.close()
+    print(f"Runtime snapshot written to {build_snapshot(database_file)}.")
+    print(f"\nData ingestion complete. Your knowledge base is updated with {chunker} chunks.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the files in Data/ into the knowledge base.")
+    parser.add_argument("--incremental", action="store_true", help="Only embed new or changed chunks.")
+    parser.add_argument("--chunker", choices=STRATEGIES, default="sentence", help="Chunking strategy (default: sentence).")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Max characters per chunk, or tokens per window for 'tokens'.")
+    parser.add_argument("--chunk-overlap", type=int, default=None, help="Tokens shared by consecutive windows ('tokens' only).")
+    parser.add_argument("--tenant", default=None, help="Ingest tenants/<id>/Data into tenants/<id>/campus.db instead of Data/ and campus.db.")
+    args = parser.parse_args()
+    database_file, data_dir = DATABASE_FILE, DATA_DIR
+    if args.tenant:
+        database_file, data_dir = tenant_paths(os.getenv("TENANTS_DIR", "tenants"), args.tenant)
     setup_nltk()
-    ingest_data()
+    ingest_data(incremental=args.incremental, chunker=Chunker(args.chunker, args.chunk_size, args.chunk_overlap),
+                database_file=database_file, data_dir=data_dir)
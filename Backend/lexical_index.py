@@ -0,0 +1,106 @@
+import re
+import time
+import sqlite3
+import argparse
+from db_pool import table_exists
+
+# --- FTS5 Lexical Index ---
+# knowledge_fts is an external-content FTS5 table over knowledge_base.content: it stores only
+# the inverted index, and reads the text itself from knowledge_base by rowid (= knowledge_base.id).
+# It is rebuilt by ingest_data.py after every ingest, like the IVF index.
+
+FTS_TABLE = "knowledge_fts"
+
+# Words that would match nearly every chunk; dropping them keeps the OR query selective.
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "can", "do", "does", "for", "from", "how", "i", "in", "is",
+    "it", "me", "my", "of", "on", "or", "tell", "the", "there", "to", "what", "when", "where",
+    "which", "who", "whom", "why", "with", "about",
+}
+
+
+def create_fts_table(conn):
+    """Creates the FTS5 table mirroring knowledge_base.content. Returns True if it was newly created."""
+    if fts_available(conn):
+        return False
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            content,
+            content='knowledge_base',
+            content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    """)
+    return True
+
+
+def rebuild_fts(conn):
+    """Re-indexes every knowledge_base row. Call inside the ingest transaction after changing the table."""
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fts_available(conn):
+    return table_exists(conn, FTS_TABLE)
+
+
+def match_expression(query):
+    """
+    Turns free text into an FTS5 MATCH expression: every non-stopword term, quoted, OR-ed together.
+    Quoting keeps user input (hyphens, colons, "AND") from being parsed as FTS5 syntax.
+    """
+    terms = [term for term in re.findall(r"\w+", query.lower()) if term not in STOPWORDS]
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+
+
+def bm25_search(conn, query, top_k=3):
+    """Returns (row id, content, score) for the top_k BM25 matches, best first (higher score = better)."""
+    expression = match_expression(query)
+    if not expression or top_k <= 0:
+        return []
+    rows = conn.execute(
+        f"SELECT rowid, content, bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? ORDER BY rank LIMIT ?",
+        (expression, top_k)
+    ).fetchall()
+    # FTS5's bm25() is negated so that ascending order is best-first
+    return [(row_id, content, -score) for row_id, content, score in rows]
+
+
+# --- Fusion ---
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses ranked lists of (row id, content, score) with reciprocal rank fusion.
+
+    Each list contributes 1 / (k + rank) per item, so items ranked well by both retrievers rise to
+    the top, and BM25 and cosine scores never need to be put on the same scale. Returns
+    (row id, content, fused score) best first.
+    """
+    fused, contents = {}, {}
+    for ranking in rankings:
+        for rank, (row_id, content, _) in enumerate(ranking, start=1):
+            fused[row_id] = fused.get(row_id, 0.0) + 1.0 / (k + rank)
+            contents[row_id] = content
+    return [(row_id, contents[row_id], score) for row_id, score in sorted(fused.items(), key=lambda item: -item[1])]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the FTS5 index over the knowledge base.")
+    parser.add_argument("command", choices=["build", "search"])
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("--db", default="campus.db")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == "build":
+            start = time.perf_counter()
+            with conn:
+                create_fts_table(conn)
+                rebuild_fts(conn)
+            count = conn.execute("SELECT COUNT(*) FROM knowledge_base").fetchone()[0]
+            print(f"Indexed {count} chunks for full-text search in {(time.perf_counter() - start) * 1000:.1f} ms.")
+        else:
+            for row_id, content, score in bm25_search(conn, args.query, args.k):
+                print(f"{score:7.3f}  [{row_id}] {content}")
+    finally:
+        conn.close()
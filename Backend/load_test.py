@@ -0,0 +1,78 @@
+import os
+import time
+import asyncio
+import argparse
+import numpy as np
+
+# --- Offline Load Test ---
+# Fires concurrent /api/query (or, with --stream, /api/query/stream) requests at the app
+# in-process and reports latency percentiles.
+# The Gemini client is replaced by a local fake with configurable latency: embedding is a
+# *blocking* call (like the real synchronous SDK) and generation is a non-blocking await, so
+# the numbers show how well the server keeps serving other requests while one is waiting.
+# Caches are disabled so every request does the full amount of work.
+os.environ.setdefault("GEMINI_API_KEY", "load-test")
+os.environ["RESPONSE_CACHE_DB"] = ""
+os.environ["DESCRIPTION_CACHE_SIZE"] = "0"
+os.environ["ANSWER_CACHE_SIZE"] = "0"
+os.environ.setdefault("LOG_LEVEL", "WARNING")  # per-request logs would dominate the measurement
+
+import httpx
+import main
+from embedding_pipeline import FakeGemini
+
+
+def knowledge_dimension():
+    tenant = main.tenants.get()
+    with tenant.db_pool.connection() as conn:
+        tenant.knowledge_index.ensure_fresh(conn)
+    return tenant.knowledge_index.stats()["dimension"] or 768
+
+
+async def run(requests, concurrency, queries, stream=False):
+    transport = httpx.ASGITransport(app=main.app)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                path = "/api/query/stream" if stream else "/api/query"
+                response = await client.post(path, json={"query": f"{queries[i % len(queries)]} #{i}"})
+                response.raise_for_status()  # the streamed body has been read in full by now
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    return np.array(latencies) * 1000, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /api/query latency under concurrent load with a fake Gemini.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per (blocking) embedding call.")
+    parser.add_argument("--generate-latency", type=float, default=0.3, help="Seconds per generation call.")
+    parser.add_argument("--stream", action="store_true", help="Load /api/query/stream instead (latency to the last event).")
+    parser.add_argument("--blocking", action="store_true",
+                        help="Run blocking work directly on the event loop, as before, for a before/after comparison.")
+    args = parser.parse_args()
+
+    fake = FakeGemini(args.embed_latency, args.generate_latency, knowledge_dimension())
+    main.genai = fake  # stands in for the SDK module: only embed_content is used
+    main.model = fake
+    if args.blocking:
+        async def run_inline(func, *func_args):
+            return func(*func_args)
+        main.run_blocking = run_inline
+
+    queries = ["What is the vision of the institute", "When was IISER TVM established", "Where is the library", "How do I get from lhc to cdh"]
+    latencies, elapsed = asyncio.run(run(args.requests, args.concurrency, queries, args.stream))
+
+    mode = "blocking (on event loop)" if args.blocking else "non-blocking (thread pool)"
+    if args.stream:
+        mode += ", streaming"
+    print(f"{mode}: {args.requests} requests, concurrency {args.concurrency}")
+    print(f"  throughput {args.requests / elapsed:.1f} req/s")
+    print(f"  p50 {np.percentile(latencies, 50):.1f} ms  p95 {np.percentile(latencies, 95):.1f} ms  p99 {np.percentile(latencies, 99):.1f} ms")
@@ -1,30 +1,188 @@
 import os
-import sqlite3
+import time
+import asyncio
 import re
-from fastapi import FastAPI
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from fastapi import FastAPI, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-import google.generativeai as genai
-import json
-import numpy as np
 from typing import Optional
+from vector_index import VectorIndex
+from lexical_index import fts_available, bm25_search, reciprocal_rank_fusion
+from alias_matcher import AliasMatcher
+from response_cache import ResponseCache, SemanticCache, cache_key
+from db_pool import ConnectionPool, table_exists
+from tenants import DEFAULT_TENANT, Tenant, TenantInfo, TenantRegistry, current_tenant_var, greeting_for
+from route_engine import RouteEngine
+from spatial_index import SpatialIndex
+from snapshot import SnapshotCache
+from streaming import SSE_HEADERS, sse_event, with_keepalive
+from metrics import Metrics, MetricsMiddleware
+from log_config import configure_logging
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Configuration ---
 load_dotenv()
+# Structured logs: LOG_FORMAT="json" (one object per line) or "text"; LOG_LEVEL filters by severity.
+configure_logging(os.getenv("LOG_LEVEL", "INFO"), os.getenv("LOG_FORMAT", "json"))
+logger = logging.getLogger("mapmycampus")
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 if not gemini_api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables.")
-genai.configure(api_key=gemini_api_key)
+    logger.warning("GEMINI_API_KEY not found in environment variables. Answers and description enrichment are unavailable.")
 
-model = genai.GenerativeModel('gemini-1.5-flash')
-DATABASE_FILE = "campus.db"
+GENERATIVE_MODEL_NAME = 'gemini-1.5-flash'
+# The Gemini SDK is imported and configured on first use (see gemini()), not at import time.
+genai = None
+model = None
+_gemini_lock = threading.RLock()
+DATABASE_FILE = os.getenv("DATABASE_FILE", "campus.db")
+# Indexes map the runtime snapshot written by ingest (see snapshot.py) when it matches the database.
+USE_SNAPSHOT = os.getenv("RUNTIME_SNAPSHOT", "1") == "1"
+# Load indexes while the server starts, so the first request doesn't pay for it.
+PRELOAD_INDEXES = os.getenv("PRELOAD_INDEXES", "1") == "1"
+# "exact" scans every embedding; "ivf" uses the approximate index built by ingest_data.py.
+KNOWLEDGE_INDEX_BACKEND = os.getenv("KNOWLEDGE_INDEX_BACKEND", "exact")
+KNOWLEDGE_INDEX_NPROBE = int(os.getenv("KNOWLEDGE_INDEX_NPROBE", "4"))
+# "hybrid" fuses BM25 (FTS5) and vector rankings; "vector" or "bm25" use one ranker only.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+if RETRIEVAL_MODE not in ("hybrid", "vector", "bm25"):
+    raise ValueError(f"Unknown RETRIEVAL_MODE '{RETRIEVAL_MODE}'.")
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+# If the embedding call fails or exceeds EMBED_TIMEOUT_SECONDS, queries are answered from BM25 alone
+# and embedding is not retried for EMBED_RETRY_AFTER_SECONDS.
+EMBED_TIMEOUT_SECONDS = float(os.getenv("EMBED_TIMEOUT_SECONDS", "3"))
+EMBED_RETRY_AFTER_SECONDS = float(os.getenv("EMBED_RETRY_AFTER_SECONDS", "30"))
+embedding_unavailable_until = 0.0
+# Maximum edits tolerated when resolving misspelt building names ("libary"); 0 disables fuzzy matching.
+FUZZY_MAX_EDITS = int(os.getenv("FUZZY_MAX_EDITS", "2"))
+# Enriched building descriptions are cached per campus (LRU + TTL); set RESPONSE_CACHE_DB="" to keep them in
+# memory only. The file keeps at most DESCRIPTION_CACHE_DB_SIZE entries and is pruned of expired ones on startup.
+DESCRIPTION_CACHE_SIZE = int(os.getenv("DESCRIPTION_CACHE_SIZE", "1024"))
+DESCRIPTION_CACHE_TTL = float(os.getenv("DESCRIPTION_CACHE_TTL", str(7 * 24 * 3600)))
+DESCRIPTION_CACHE_DB_SIZE = int(os.getenv("DESCRIPTION_CACHE_DB_SIZE", "10000"))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "response_cache.db")
+# Blocking work (SQLite, NumPy scoring, the synchronous embedding client) runs on a bounded
+# thread pool so it never stalls the event loop; SQLite connections are reused from a pool.
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+# Answers to informational queries are reused for near-identical questions with the same retrieved context.
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+# Campuses: DATABASE_FILE is the default tenant (CAMPUS_NAME); others live under TENANTS_DIR (see
+# tenants.py). Tenants load on first use and the least recently used are evicted beyond the budget.
+CAMPUS_NAME = os.getenv("CAMPUS_NAME", "IISER TVM")
+TENANTS_DIR = os.getenv("TENANTS_DIR", "tenants")
+TENANT_MEMORY_BUDGET_MB = float(os.getenv("TENANT_MEMORY_BUDGET_MB", "1024"))
+# Requests for an unknown campus rescan TENANTS_DIR at most this often.
+TENANT_REFRESH_SECONDS = float(os.getenv("TENANT_REFRESH_SECONDS", "30"))
+# Idle streaming responses (/api/query/stream) send a keep-alive comment this often.
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+# Per-stage latency histograms served at /metrics; TIMING_HEADER=1 also returns a Server-Timing header.
+metrics = Metrics(enabled=os.getenv("METRICS_ENABLED", "1") == "1")
+TIMING_HEADER = os.getenv("TIMING_HEADER", "0") == "1"
+
+# --- Tenants ---
+def description_cache_path(info):
+    """The default campus writes descriptions to RESPONSE_CACHE_DB, other campuses to a file of that name in their directory."""
+    if not RESPONSE_CACHE_DB:
+        return None
+    if info.id == DEFAULT_TENANT:
+        return RESPONSE_CACHE_DB
+    return os.path.join(os.path.dirname(info.database_file), os.path.basename(RESPONSE_CACHE_DB))
+
+def open_tenant(info):
+    """Creates a tenant's indexes, connection pool and caches (the indexes load on first use)."""
+    snapshots = SnapshotCache(info.database_file) if USE_SNAPSHOT else None
+    return Tenant(
+        info,
+        knowledge_index=VectorIndex(info.database_file, backend=KNOWLEDGE_INDEX_BACKEND, nprobe=KNOWLEDGE_INDEX_NPROBE, snapshots=snapshots),
+        alias_matcher=AliasMatcher(info.database_file, max_edits=FUZZY_MAX_EDITS, snapshots=snapshots),
+        route_engine=RouteEngine(info.database_file),
+        spatial_index=SpatialIndex(info.database_file, snapshots=snapshots),
+        db_pool=ConnectionPool(info.database_file, size=BLOCKING_POOL_SIZE),
+        answer_cache=SemanticCache(max_entries=ANSWER_CACHE_SIZE, threshold=ANSWER_CACHE_THRESHOLD, ttl_seconds=ANSWER_CACHE_TTL),
+        description_cache=ResponseCache(max_entries=DESCRIPTION_CACHE_SIZE, ttl_seconds=DESCRIPTION_CACHE_TTL,
+                                        persist_path=description_cache_path(info), max_persisted=DESCRIPTION_CACHE_DB_SIZE),
+        snapshots=snapshots,
+    )
+
+tenants = TenantRegistry(
+    open_tenant,
+    default=TenantInfo(DEFAULT_TENANT, CAMPUS_NAME, DATABASE_FILE, "Data", greeting_for(CAMPUS_NAME)),
+    tenants_dir=TENANTS_DIR,
+    memory_budget_bytes=int(TENANT_MEMORY_BUDGET_MB * 2 ** 20),
+    refresh_interval=TENANT_REFRESH_SECONDS,
+)
+
+def tenant():
+    """The tenant of the request being handled (the default tenant outside of one)."""
+    return current_tenant_var.get() or tenants.get()
+
+def select_tenant(tenant_id):
+    """Makes tenant_id the current request's tenant. Returns an error payload if it is unknown, else None."""
+    try:
+        current_tenant_var.set(tenants.get(tenant_id))
+    except KeyError:
+        return {"type": "error", "message": f"Unknown campus '{tenant_id}'."}
+    return None
+
+# --- Gemini Client ---
+def gemini():
+    """The google.generativeai module, imported and configured on first use."""
+    global genai
+    if genai is None:
+        with _gemini_lock:
+            if genai is None:
+                if not gemini_api_key:
+                    raise RuntimeError("GEMINI_API_KEY not found in environment variables.")
+                import google.generativeai as sdk
+                sdk.configure(api_key=gemini_api_key)
+                genai = sdk
+    return genai
+
+def generative_model():
+    """The Gemini model used for answers and descriptions, created on first use."""
+    global model
+    if model is None:
+        with _gemini_lock:
+            if model is None:
+                model = gemini().GenerativeModel(GENERATIVE_MODEL_NAME)
+    return model
+
+def preload_indexes():
+    """Loads the default tenant's alias matcher, spatial index and knowledge index (from the snapshot when current)."""
+    start = time.perf_counter()
+    current = tenants.get()
+    current.alias_matcher.ensure_fresh()
+    current.spatial_index.ensure_fresh()
+    with current.db_pool.connection() as conn:
+        if table_exists(conn, "knowledge_base"):
+            current.knowledge_index.ensure_fresh(conn)
+    logger.info("Indexes loaded", extra={"duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                                         "knowledge_source": current.knowledge_index.source})
+
+@asynccontextmanager
+async def lifespan(app):
+    await run_blocking(tenants.get().description_cache.prune)
+    if PRELOAD_INDEXES:
+        try:
+            await run_blocking(preload_indexes)
+        except Exception as e:
+            logger.warning("Could not preload indexes; they will load on first use", extra={"error": str(e)})
+    yield
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="Campus Navigator API",
     description="Backend service for the IISER TVM Campus Navigator application.",
-    version="2.5.0" # Version bump for improved route parsing
+    version="2.5.0", # Version bump for improved route parsing
+    lifespan=lifespan,
 )
 
 # --- CORS ---
@@ -34,157 +192,459 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
+app.add_middleware(MetricsMiddleware, metrics=metrics, timing_header=TIMING_HEADER)
 
 # --- Database Helper ---
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+async def run_blocking(func, *args):
+    """Runs a blocking function on the bounded worker pool and awaits its result."""
+    # The worker runs in a copy of this context, so stage timings and the request id follow it
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(blocking_executor, context.run, func, *args)
 
-def check_table_exists(conn, table_name):
-    cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
-    return cursor.fetchone() is not None
+@contextmanager
+def db_connection():
+    """Borrows a pooled connection, timing how long it took to get one."""
+    start = time.perf_counter()
+    with tenant().db_pool.connection() as conn:
+        metrics.observe_stage("db_connect", time.perf_counter() - start)
+        yield conn
 
 # --- Pydantic Models ---
 class QueryRequest(BaseModel):
     query: str
     is_3d: Optional[bool] = Field(None, alias='is_3d')
+    tenant: Optional[str] = None  # campus id; None selects the default campus
 
 # --- Helper Functions ---
 
 def find_mentioned_buildings_from_db(query: str):
     """
-    **FIXED FUNCTION:** Finds all building names mentioned in the query by checking every alias
-    against the query string. This correctly handles multiple mentions for routes.
+    Finds all building names mentioned in the query, in order of first appearance.
+    Uses a matcher precompiled from the aliases table (rebuilt when campus.db changes), where the
+    longest matching alias wins, so per-query cost depends on query length rather than alias count.
+    Words that match no alias exactly are resolved against a trigram index with bounded edit
+    distance, so typos like "libary" or "anamdi" still resolve locally instead of hitting the LLM.
     """
-    conn = get_db_connection()
-    mentioned_buildings = []
-    try:
-        if not check_table_exists(conn, "aliases"):
-            print("Warning: 'aliases' table not found.")
-            return []
-        
-        cursor = conn.execute("SELECT b.name as building_name, a.name as alias_name FROM buildings b JOIN aliases a ON b.id = a.building_id")
-        all_aliases = cursor.fetchall()
-        
-        # Sort by alias length (descending) to match longer names first (e.g., "lecture hall complex" before "lhc")
-        sorted_aliases = sorted(all_aliases, key=lambda x: len(x['alias_name']), reverse=True)
-
-        lower_query = query.lower()
-        found_buildings = {} # Use a dict to store found buildings and their index in the query
-
-        for row in sorted_aliases:
-            alias = row['alias_name'].lower()
-            building_name = row['building_name']
-            
-            # Find all occurrences of the alias in the query
-            for match in re.finditer(r'\b' + re.escape(alias) + r'\b', lower_query):
-                # Only add if this building hasn't been found already
-                if building_name not in found_buildings:
-                    found_buildings[building_name] = match.start()
-
-        # Sort the found buildings by their order of appearance in the query string
-        sorted_found_buildings = sorted(found_buildings.keys(), key=lambda b: found_buildings[b])
-        
-        return sorted_found_buildings
-    finally:
-        if conn:
-            conn.close()
+    with metrics.stage("alias_match"):
+        return tenant().alias_matcher.find(query)
+
+
+def description_prompt(building_name, default_description):
+    return f"""Rewrite the following factual description of "{building_name}" into a short, engaging, single-paragraph response for a student. Do not add new facts or use newline characters. Factual Description: "{default_description}" """
 
+def clean_description(text):
+    return re.sub(r'\s+', ' ', text.replace('\n', ' ')).strip()
 
 async def get_enriched_description(building_name: str, default_description: str) -> str:
-    prompt = f"""Rewrite the following factual description of "{building_name}" into a short, engaging, single-paragraph response for a student. Do not add new facts or use newline characters. Factual Description: "{default_description}" """
+    prompt = description_prompt(building_name, default_description)
+    key = cache_key(GENERATIVE_MODEL_NAME, building_name, default_description, prompt)
+    description_cache = tenant().description_cache
+    with metrics.stage("description_cache"):
+        cached = await run_blocking(description_cache.get, key)
+    if cached is not None:
+        return cached
     try:
-        response = await model.generate_content_async(prompt)
-        text_no_newlines = response.text.replace('\n', ' ')
-        clean_text = re.sub(r'\s+', ' ', text_no_newlines).strip()
-        return clean_text if clean_text else default_description
+        with metrics.stage("describe"):
+            response = await generative_model().generate_content_async(prompt)
+        clean_text = clean_description(response.text)
+        if not clean_text:
+            return default_description
+        await run_blocking(description_cache.set, key, clean_text)
+        return clean_text
     except Exception as e:
-        print(f"Gemini API error during enrichment: {e}")
+        logger.warning("Gemini API error during enrichment", extra={"building": building_name, "error": str(e)})
         return default_description
 
-def cosine_similarity(v1, v2):
-    return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+async def prewarm_description_cache(concurrency=4):
+    """Generates and caches the enriched description of every building. Returns the number of buildings."""
+    rows = await run_blocking(fetch_all_buildings)
+    semaphore = asyncio.Semaphore(concurrency)
 
-def find_relevant_knowledge(query_embedding, conn, top_k=3):
-    cursor = conn.execute("SELECT content, embedding FROM knowledge_base")
-    knowledge_chunks = cursor.fetchall()
-    if not knowledge_chunks: return []
+    async def warm(row):
+        async with semaphore:
+            await get_enriched_description(row['name'], row['description'])
 
-    similarities = [(cosine_similarity(query_embedding, np.array(json.loads(row['embedding']))), row['content']) for row in knowledge_chunks]
-    similarities.sort(key=lambda x: x[0], reverse=True)
-    return [content for sim, content in similarities[:top_k]]
+    await asyncio.gather(*(warm(row) for row in rows))
+    return len(rows)
+
+def fetch_all_buildings():
+    with db_connection() as conn:
+        return [dict(row) for row in conn.execute("SELECT * FROM buildings")]
+
+def fetch_buildings(names):
+    """Returns the buildings rows for the given names (None for unknown names), in order."""
+    with db_connection() as conn:
+        with metrics.stage("db_query"):
+            rows = []
+            for name in names:
+                row = conn.execute("SELECT * FROM buildings WHERE name = ?", (name,)).fetchone()
+                rows.append(dict(row) if row else None)
+            return rows
+
+def find_relevant_knowledge(query, query_embedding, conn, top_k=3):
+    """
+    Ranks knowledge chunks for a query. In hybrid mode the BM25 and vector candidate lists are
+    merged with reciprocal rank fusion; without an embedding (or without the FTS table) the
+    remaining ranker is used on its own.
+    """
+    rankings = []
+    if query_embedding is not None and RETRIEVAL_MODE != "bm25":
+        knowledge_index = tenant().knowledge_index
+        knowledge_index.ensure_fresh(conn)
+        with metrics.stage("vector_search"):
+            rankings.append(knowledge_index.search_with_ids(query_embedding, RETRIEVAL_CANDIDATES))
+    if (RETRIEVAL_MODE != "vector" or query_embedding is None) and fts_available(conn):
+        with metrics.stage("bm25_search"):
+            rankings.append(bm25_search(conn, query, RETRIEVAL_CANDIDATES))
+    if len(rankings) == 1:
+        return [content for _, content, _ in rankings[0][:top_k]]
+    return [content for _, content, _ in reciprocal_rank_fusion(rankings)[:top_k]]
+
+def embed_query(query):
+    result = gemini().embed_content(model="models/text-embedding-004", content=query, task_type="RETRIEVAL_QUERY")
+    return result['embedding']
+
+async def try_embed_query(query):
+    """The query embedding, or None if the embedding service is failing or slow (BM25 then answers alone)."""
+    global embedding_unavailable_until
+    if RETRIEVAL_MODE == "bm25" or time.monotonic() < embedding_unavailable_until:
+        return None
+    try:
+        with metrics.stage("embed"):
+            return await asyncio.wait_for(run_blocking(embed_query, query), timeout=EMBED_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning("Embedding unavailable; using BM25 only", extra={
+            "error": f"{type(e).__name__}: {e}", "retry_after_s": EMBED_RETRY_AFTER_SECONDS
+        })
+        embedding_unavailable_until = time.monotonic() + EMBED_RETRY_AFTER_SECONDS
+        return None
+
+def retrieve_context(query, query_embedding):
+    """Returns the relevant chunks for a query, or None if the knowledge base isn't set up."""
+    with db_connection() as conn:
+        if not table_exists(conn, "knowledge_base"):
+            return None
+        return find_relevant_knowledge(query, query_embedding, conn)
+
+ANSWER_PROMPT = """Answer the user's question using ONLY the provided context. Be concise. If the answer is not in the context, say you don't have information on that topic. Context: --- {context} --- Question: {query} Direct Answer:"""
+
+async def prepare_knowledge_answer(query: str):
+    """
+    Retrieves context for an informational query. Returns (payload, prompt, remember): either a
+    finished payload (error, no context, cached answer) with prompt None, or the prompt to generate
+    from and a callback that caches the generated answer.
+    """
+    query_embedding = await try_embed_query(query)
+    context_chunks = await run_blocking(retrieve_context, query, query_embedding)
+    if context_chunks is None:
+        return {"type": "error", "message": "My knowledge base isn't set up."}, None, None
+
+    if not context_chunks:
+        return {"type": "answer", "message": "Sorry, I couldn't find an answer."}, None, None
+
+    context_key = cache_key(*context_chunks)
+    current = tenant()
+    answer_cache, version = current.answer_cache, current.knowledge_index.version
+    if query_embedding is not None:
+        with metrics.stage("answer_cache"):
+            cached_answer = answer_cache.get(query_embedding, context_key, version=version)
+        if cached_answer is not None:
+            return {"type": "answer", "message": cached_answer}, None, None
+
+    def remember(answer):
+        if query_embedding is not None:
+            answer_cache.set(query_embedding, context_key, answer, version=version)
+
+    prompt = ANSWER_PROMPT.format(context="\n\n".join(context_chunks), query=query)
+    return None, prompt, remember
 
 async def search_knowledge_base(query: str):
-    print(f"Handling as informational query. Searching knowledge base for: '{query}'")
-    conn = None
+    logger.info("Handling as informational query", extra={"query": query})
     try:
-        conn = get_db_connection()
-        if not check_table_exists(conn, "knowledge_base"):
-            return {"type": "error", "message": "My knowledge base isn't set up."}
-        
-        query_embedding_result = genai.embed_content(model="models/text-embedding-004", content=query, task_type="RETRIEVAL_QUERY")
-        context_chunks = find_relevant_knowledge(query_embedding_result['embedding'], conn)
-
-        if not context_chunks:
-            return {"type": "answer", "message": "Sorry, I couldn't find an answer."}
-
-        context_str = "\n\n".join(context_chunks)
-        prompt = f"""Answer the user's question using ONLY the provided context. Be concise. If the answer is not in the context, say you don't have information on that topic. Context: --- {context_str} --- Question: {query} Direct Answer:"""
-        response = await model.generate_content_async(prompt)
+        payload, prompt, remember = await prepare_knowledge_answer(query)
+        if prompt is None:
+            return payload
+        with metrics.stage("generate"):
+            response = await generative_model().generate_content_async(prompt)
+        remember(response.text)
         return {"type": "answer", "message": response.text}
     except Exception as e:
-        print(f"Error during knowledge base query: {e}")
+        logger.error("Error during knowledge base query", extra={"query": query, "error": str(e)})
         return {"type": "error", "message": "I encountered a problem trying to answer your question."}
+
+async def generate_stream(prompt):
+    """Yields generated text as Gemini produces it, timing the first chunk and the whole generation."""
+    start = time.perf_counter()
+    first = True
+    try:
+        response = await generative_model().generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if first:
+                metrics.observe_stage("first_token", time.perf_counter() - start)
+                first = False
+            if chunk.text:
+                yield chunk.text
     finally:
-        if conn: conn.close()
+        metrics.observe_stage("generate_stream", time.perf_counter() - start)
+
+# "within 200 m of X", "nearest canteen to X", "canteens near X"
+RADIUS_PATTERN = re.compile(r"^(?P<category>.*?)\bwithin\s+(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>km|kilomet(?:er|re)s?|m|met(?:er|re)s?)\s+(?:of|from|around)\s+(?P<anchor>.+)$")
+NEAREST_PATTERN = re.compile(r"\b(?:nearest|closest)\s+(?P<category>.+?)\s+(?:to|from|near)\s+(?P<anchor>.+)$")
+NEAR_PATTERN = re.compile(r"^(?P<category>.+?)\s+(?:near|nearby|close to|around)\s+(?P<anchor>.+)$")
+
+def parse_nearby_query(lower_query):
+    """
+    Recognises "nearest"/"within" questions. Returns (anchor building name, tag, radius in metres)
+    with radius None for k-nearest queries, or None if the query isn't a resolvable nearby query.
+    """
+    match = RADIUS_PATTERN.search(lower_query)
+    if match:
+        radius_m = float(match['value']) * (1000 if match['unit'].startswith('k') else 1)
+    else:
+        match = NEAREST_PATTERN.search(lower_query) or NEAR_PATTERN.search(lower_query)
+        radius_m = None
+    if not match:
+        return None
+    anchors = find_mentioned_buildings_from_db(match['anchor'])
+    tag = tenant().spatial_index.resolve_tag(match['category'])
+    # Plain "X near Y" only counts when X is a known category, so routes like "lhc near cdh" still work
+    if not anchors or (radius_m is None and tag is None):
+        return None
+    return anchors[0], tag, radius_m
+
+def find_query_buildings(query):
+    """
+    (parsed nearby query or None, building names mentioned in the query). Runs on the worker pool:
+    the alias and spatial indexes rebuild from SQLite when campus.db has changed.
+    """
+    with metrics.stage("nearby_parse"):
+        nearby = parse_nearby_query(query.lower())
+    if nearby:
+        return nearby, []
+    return None, find_mentioned_buildings_from_db(query)
+
+def nearby_message(origin_name, tag, radius_m, results):
+    """One-line summary of a nearby search for the chat, e.g. "Closest to Ponmudi Hostel (canteen): I Cafe (120 m)."."""
+    place = f"within {radius_m:g} m of {origin_name}" if radius_m is not None else f"near {origin_name}"
+    if not results:
+        kind = f"any '{tag}'" if tag else "anything"
+        return f"I couldn't find {kind} {place}."
+    heading = f"Within {radius_m:g} m of {origin_name}" if radius_m is not None else f"Closest to {origin_name}"
+    if tag:
+        heading += f" ({tag})"
+    listing = ", ".join(f"{result['name']} ({result['distance_m']:.0f} m)" for result in results)
+    return f"{heading}: {listing}."
+
+def nearby_payload(origin, tag, radius_m, results):
+    """The "nearby" response: the origin, the matches closest first, and a readable summary for the chat."""
+    message = nearby_message(origin.get('name', "that point"), tag, radius_m, results)
+    return {"type": "nearby", "message": message, "origin": origin, "category": tag, "radius_m": radius_m, "results": results}
+
+def nearby_response(anchor_name, tag=None, radius_m=None, k=3):
+    spatial_index = tenant().spatial_index
+    with metrics.stage("spatial_search"):
+        origin = spatial_index.get(anchor_name)
+        if origin is None:
+            return {"type": "error", "message": f"I don't have map coordinates for {anchor_name}."}
+        if radius_m is not None:
+            results = spatial_index.within(origin['lat'], origin['lng'], radius_m, tag=tag, exclude=anchor_name)
+        else:
+            results = spatial_index.nearest(origin['lat'], origin['lng'], k=k, tag=tag, exclude=anchor_name)
+    return nearby_payload(origin, tag, radius_m, results)
 
 # --- API Endpoints ---
 @app.get("/api/config")
 def get_config():
     return {"Maps_api_key": os.getenv("Maps_API_KEY")}
 
-@app.post("/api/query")
-async def handle_query(request: QueryRequest):
-    query = request.query.strip()
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of per-stage and per-endpoint latency histograms."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/knowledge/stats")
+def get_knowledge_stats(tenant: Optional[str] = None):
+    try:
+        selected = tenants.get(tenant)
+    except KeyError:
+        return {"type": "error", "message": f"Unknown campus '{tenant}'."}
+    return {**selected.knowledge_index.stats(), "retrieval_mode": RETRIEVAL_MODE, "tenant": selected.id}
+
+@app.get("/api/cache/stats")
+def get_cache_stats(tenant: Optional[str] = None):
+    try:
+        selected = tenants.get(tenant)
+    except KeyError:
+        return {"type": "error", "message": f"Unknown campus '{tenant}'."}
+    return {"answers": selected.answer_cache.stats(), "descriptions": selected.description_cache.stats(), "tenant": selected.id}
+
+@app.get("/api/tenants")
+def get_tenants():
+    """Known campuses, which of them are loaded in this worker, and their approximate memory use."""
+    return tenants.stats()
+
+@app.get("/api/nearby")
+async def get_nearby(
+    building: Optional[str] = None,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    k: int = Query(5, ge=1, le=100),
+    radius_m: Optional[float] = Query(None, gt=0),
+    tag: Optional[str] = None,
+    tenant: Optional[str] = None,
+):
+    """k-nearest (default) or radius search around a building name or a lat/lng point."""
+    error = select_tenant(tenant)
+    if error:
+        return error
+    spatial_index = current_tenant_var.get().spatial_index
+    tag = tag.lower() if tag else None
+    if building:
+        names = await run_blocking(find_mentioned_buildings_from_db, building)
+        if not names:
+            return {"type": "error", "message": f"Unknown building '{building}'."}
+        return await run_blocking(nearby_response, names[0], tag, radius_m, k)
+    if lat is None or lng is None:
+        return {"type": "error", "message": "Provide either 'building' or both 'lat' and 'lng'."}
+    if radius_m is not None:
+        results = await run_blocking(spatial_index.within, lat, lng, radius_m, tag)
+    else:
+        results = await run_blocking(spatial_index.nearest, lat, lng, k, tag)
+    return nearby_payload({"lat": lat, "lng": lng}, tag, radius_m, results)
+
+async def resolve_query(query: str):
+    """
+    Answers everything that comes straight from the database. Returns (payload, pending):
+    pending is "describe" when the payload is a location whose description should be enriched,
+    "answer" when the query must be answered from the knowledge base (payload is None), else None.
+    """
     lower_query = query.lower()
 
     GREETINGS = {"hello", "hi", "hey", "hai", "hello."}
     if lower_query in GREETINGS:
-        return {"type": "greeting", "message": "Hello! How can I help you with IISER TVM today?"}
+        return {"type": "greeting", "message": tenant().info.greeting}, None
 
-    print(f"Searching for location mentions in query: '{query}'")
-    mentioned_keys = find_mentioned_buildings_from_db(query)
+    nearby, mentioned_keys = await run_blocking(find_query_buildings, query)
+    if nearby:
+        logger.info("Handling as nearby query", extra={"query": query, "anchor": nearby[0], "category": nearby[1], "radius_m": nearby[2]})
+        return await run_blocking(nearby_response, *nearby), None
     
     if not mentioned_keys:
-        print("No specific location found in DB. Handling as informational query.")
+        logger.info("No specific location found in DB. Handling as informational query.", extra={"query": query})
+        return None, "answer"
+
+    logger.info("Handling as location query", extra={"query": query, "buildings": mentioned_keys})
+    if len(mentioned_keys) >= 2:
+        from_data, to_data = await run_blocking(fetch_buildings, mentioned_keys[:2])
+        if from_data and to_data:
+            with metrics.stage("route"):
+                route = await run_blocking(tenant().route_engine.route, from_data['name'], to_data['name'])
+            response = {"type": "route", "from": from_data, "to": to_data}
+            if route:
+                response["path"] = route
+            return response, None
+
+    loc_data = (await run_blocking(fetch_buildings, mentioned_keys[:1]))[0]
+    if loc_data:
+        return {"type": "location", **loc_data}, "describe"
+
+    # Fallback if DB lookup fails for some reason
+    return None, "answer"
+
+@app.post("/api/query")
+async def handle_query(request: QueryRequest):
+    error = select_tenant(request.tenant)
+    if error:
+        return error
+    query = request.query.strip()
+    payload, pending = await resolve_query(query)
+    if pending == "answer":
         return await search_knowledge_base(query)
+    if pending == "describe":
+        payload['description'] = await get_enriched_description(payload['name'], payload['description'])
+    return payload
 
-    print(f"Found location mentions: {mentioned_keys}. Handling as location query.")
-    conn = get_db_connection()
+async def stream_query(query: str):
+    """
+    SSE events for /api/query/stream: "payload" carries the database answer as soon as it is known
+    (the same object /api/query returns, before any generated text), "token" events carry generated
+    text as it arrives, and "done" carries the final text. Failures are reported as an "error" event.
+    """
+    payload, pending = await resolve_query(query)
+    if pending is None:
+        yield sse_event("payload", payload)
+        yield sse_event("done", {})
+        return
+
+    if pending == "describe":
+        yield sse_event("payload", payload)
+        default_description = payload['description']
+        prompt = description_prompt(payload['name'], default_description)
+        key = cache_key(GENERATIVE_MODEL_NAME, payload['name'], default_description, prompt)
+        description_cache = tenant().description_cache
+        cached = await run_blocking(description_cache.get, key)
+        if cached is not None:
+            yield sse_event("token", {"text": cached})
+            yield sse_event("done", {"message": cached})
+            return
+
+        def remember(text):
+            description_cache.set(key, text)
+    else:
+        logger.info("Handling as informational query (streaming)", extra={"query": query})
+        yield sse_event("payload", {"type": "answer", "message": ""})
+        try:
+            finished, prompt, remember = await prepare_knowledge_answer(query)
+        except Exception as e:
+            logger.error("Error during knowledge base query", extra={"query": query, "error": str(e)})
+            yield sse_event("error", {"message": "I encountered a problem trying to answer your question."})
+            return
+        if prompt is None:
+            if finished['type'] == "error":
+                yield sse_event("error", {"message": finished['message']})
+            else:
+                yield sse_event("token", {"text": finished['message']})
+                yield sse_event("done", {"message": finished['message']})
+            return
+
+    parts = []
     try:
-        if len(mentioned_keys) >= 2:
-            from_cursor = conn.execute("SELECT * FROM buildings WHERE name = ?", (mentioned_keys[0],))
-            from_data_row = from_cursor.fetchone()
-            to_cursor = conn.execute("SELECT * FROM buildings WHERE name = ?", (mentioned_keys[1],))
-            to_data_row = to_cursor.fetchone()
-            if from_data_row and to_data_row:
-                return {"type": "route", "from": dict(from_data_row), "to": dict(to_data_row)}
-
-        cursor = conn.execute("SELECT * FROM buildings WHERE name = ?", (mentioned_keys[0],))
-        loc_data_row = cursor.fetchone()
-        if loc_data_row:
-            loc_data = dict(loc_data_row)
-            enriched_description = await get_enriched_description(loc_data['name'], loc_data['description'])
-            loc_data['description'] = enriched_description
-            return {"type": "location", **loc_data}
-            
-    finally:
-        if conn: conn.close()
+        async for text in generate_stream(prompt):
+            if pending == "describe":
+                text = text.replace('\n', ' ')
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+    except asyncio.CancelledError:
+        logger.info("Client disconnected; generation cancelled", extra={"chunks_sent": len(parts)})
+        raise
+    except Exception as e:
+        logger.error("Error while streaming a generated response", extra={"error": str(e)})
+        if pending == "describe":
+            yield sse_event("done", {"message": default_description})
+        else:
+            yield sse_event("error", {"message": "I encountered a problem trying to answer your question."})
+        return
 
-    # Fallback if DB lookup fails for some reason
-    return await search_knowledge_base(query)
+    text = "".join(parts)
+    if pending == "describe":
+        text = clean_description(text)
+    if text:
+        await run_blocking(remember, text)
+    elif pending == "describe":
+        text = default_description
+    yield sse_event("done", {"message": text})
+
+@app.post("/api/query/stream")
+async def handle_query_stream(request: QueryRequest):
+    """Streaming variant of /api/query (Server-Sent Events)."""
+    error = select_tenant(request.tenant)
+    if error:
+        return StreamingResponse(iter([sse_event("error", {"message": error['message']})]),
+                                 media_type="text/event-stream", headers=SSE_HEADERS)
+    events = with_keepalive(stream_query(request.query.strip()), STREAM_KEEPALIVE_SECONDS)
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,212 @@
+import time
+import uuid
+import logging
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- Latency Histograms ---
+# Each stage of a request (alias matching, embedding, the similarity scan, generation, ...) is
+# timed into a fixed-bucket histogram. Recording is a bisect plus three additions under a lock,
+# so instrumentation costs a few microseconds per stage; percentiles are estimated from the
+# buckets when /metrics is scraped.
+
+# Log-spaced bucket upper bounds (seconds): 0.1 ms to ~2 min, each 1.5x the previous.
+BUCKETS = tuple(round(0.0001 * 1.5 ** i, 7) for i in range(35))
+QUANTILES = (0.5, 0.95, 0.99)
+
+logger = logging.getLogger("mapmycampus.http")
+
+# Per-request state: the request id (for logs) and the stage timings (for the Server-Timing header).
+request_id_var = contextvars.ContextVar("request_id", default=None)
+request_timings_var = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed bucket bounds (seconds)."""
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: above the largest bound
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, q):
+        """Estimates the q-quantile by linear interpolation inside the bucket that contains it."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return 0.0
+        target = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= target:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (target - cumulative) / count
+            cumulative += count
+        return self.bounds[-1]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+
+class Metrics:
+    """Registry of stage and request histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, namespace="mapmycampus", enabled=True):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.stages = {}     # stage -> Histogram
+        self.requests = {}   # (method, path) -> Histogram
+        self.responses = {}  # (method, path, status) -> count
+        self._lock = threading.Lock()
+
+    def _histogram(self, registry, key):
+        histogram = registry.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = registry.setdefault(key, Histogram())
+        return histogram
+
+    def observe_stage(self, stage, seconds):
+        if not self.enabled:
+            return
+        self._histogram(self.stages, stage).observe(seconds)
+        timings = request_timings_var.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    @contextmanager
+    def stage(self, name):
+        """Times the with-block as one occurrence of stage `name`."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - start)
+
+    def observe_request(self, method, path, status, seconds):
+        if not self.enabled:
+            return
+        self._histogram(self.requests, (method, path)).observe(seconds)
+        with self._lock:
+            key = (method, path, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self):
+        """Prometheus text exposition (version 0.0.4) of every histogram plus estimated quantiles."""
+        lines = []
+
+        def histogram_lines(name, help_text, series):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series:
+                counts, count, total = histogram.snapshot()
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.bounds, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {count}")
+
+        stage_series = [(f'stage="{stage}"', histogram) for stage, histogram in sorted(self.stages.items())]
+        request_series = [(f'method="{method}",path="{path}"', histogram)
+                          for (method, path), histogram in sorted(self.requests.items())]
+
+        histogram_lines(f"{self.namespace}_stage_duration_seconds", "Time spent in each stage of request handling.", stage_series)
+        name = f"{self.namespace}_stage_duration_quantile_seconds"
+        lines.append(f"# HELP {name} Estimated p50/p95/p99 stage latency (from the histogram buckets).")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, histogram in stage_series:
+            for q in QUANTILES:
+                lines.append(f'{name}{{{labels},quantile="{q}"}} {histogram.quantile(q):.6f}')
+
+        histogram_lines(f"{self.namespace}_request_duration_seconds", "HTTP request latency by endpoint.", request_series)
+        name = f"{self.namespace}_responses_total"
+        lines.append(f"# HELP {name} HTTP responses by endpoint and status code.")
+        lines.append(f"# TYPE {name} counter")
+        for (method, path, status), count in sorted(self.responses.items()):
+            lines.append(f'{name}{{method="{method}",path="{path}",status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def stage_totals_ms(timings):
+    """Sums (stage, seconds) timings per stage, in milliseconds, keeping first-seen order."""
+    totals = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds * 1000
+    return {stage: round(ms, 3) for stage, ms in totals.items()}
+
+
+def server_timing(timings):
+    """Formats stage timings as a Server-Timing header value (durations in ms, repeated stages summed)."""
+    return ", ".join(f"{stage};dur={ms:.2f}" for stage, ms in stage_totals_ms(timings).items())
+
+
+# --- ASGI Middleware ---
+class MetricsMiddleware:
+    """
+    Times every HTTP request, assigns it a request id (taken from X-Request-ID if the client sent
+    one) and, if timing_header is set, reports the stage timings collected before the response
+    started in a Server-Timing header. Pure ASGI, so streaming responses pass through untouched.
+    """
+
+    def __init__(self, app, metrics, timing_header=False):
+        self.app = app
+        self.metrics = metrics
+        self.timing_header = timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id")
+        request_id = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex[:16]
+        id_token = request_id_var.set(request_id)
+        timings = []
+        timings_token = request_timings_var.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                if self.timing_header:
+                    stages = timings + [("total", time.perf_counter() - start)]
+                    headers.append((b"server-timing", server_timing(stages).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Label by route only when one matched, so unknown URLs can't create unbounded series
+            path = scope["path"] if scope.get("endpoint") is not None else "unmatched"
+            self.metrics.observe_request(scope["method"], path, status, elapsed)
+            logger.info("request", extra={
+                "method": scope["method"], "path": scope["path"], "status": status,
+                "duration_ms": round(elapsed * 1000, 3), "stages_ms": stage_totals_ms(timings),
+            })
+            request_timings_var.reset(timings_token)
+            request_id_var.reset(id_token)
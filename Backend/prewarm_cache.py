@@ -0,0 +1,21 @@
+import asyncio
+import argparse
+import time
+from main import prewarm_description_cache, select_tenant, tenant
+
+# Fills the description cache for every building so the first location queries after a
+# (re)start are served from the cache instead of waiting on a Gemini round trip.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate enriched building descriptions.")
+    parser.add_argument("--tenant", default=None, help="Campus to warm (default: the default campus).")
+    args = parser.parse_args()
+    error = select_tenant(args.tenant)
+    if error:
+        raise SystemExit(error["message"])
+    description_cache = tenant().description_cache
+    description_cache.prune()
+    start = time.perf_counter()
+    count = asyncio.run(prewarm_description_cache())
+    stats = description_cache.stats()
+    print(f"Pre-warmed descriptions for {count} buildings in {time.perf_counter() - start:.1f}s "
+          f"({stats['hits']} already cached, {stats['misses']} generated).")
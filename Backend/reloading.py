@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import threading
+
+
+# --- Reloading Indexes ---
+# The alias matcher, spatial index, route engine and knowledge index are all in-memory structures
+# derived from the database file. They share one freshness check: a (mtime, size) signature of
+# the files they are built from, compared on every use and rebuilt under a lock (checked again
+# inside it, so concurrent requests build once) when it changes.
+
+def file_signature(path):
+    """(mtime in ns, size) of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class ReloadingIndex:
+    """
+    Base class for indexes rebuilt whenever their database file changes on disk.
+
+    Subclasses implement build(conn). ensure_fresh(*args) calls reload(*args) when the signature
+    changed; the default reload opens the database and calls build, and subclasses override it to
+    load from the runtime snapshot or a connection they are given instead. An index without a
+    database file (compiled directly from data) never reloads.
+    """
+
+    def __init__(self, database_file):
+        self.database_file = database_file
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        return file_signature(self.database_file)
+
+    def ensure_fresh(self, *args):
+        """Rebuilds the index if the database has changed since the last build."""
+        if self.database_file is None:
+            return
+        signature = self._current_signature()
+        if signature is not None and signature == self._signature:
+            return
+        with self._lock:
+            if signature is not None and signature == self._signature:
+                return
+            self.reload(*args)
+            self._signature = signature
+
+    def reload(self):
+        conn = sqlite3.connect(self.database_file)
+        try:
+            self.build(conn)
+        finally:
+            conn.close()
+
+    def build(self, conn):
+        raise NotImplementedError
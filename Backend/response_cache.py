@@ -0,0 +1,227 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def cache_key(*parts):
+    """Stable key for a cached response: a SHA-256 over all of its inputs."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache with a TTL for LLM-generated text.
+
+    Entries live in memory (bounded by max_entries, least recently used evicted first) and,
+    if persist_path is set, are written through to a small SQLite file so warm entries
+    survive restarts. The file keeps at most max_persisted entries (oldest deleted first).
+    Entries older than ttl_seconds are treated as misses in both tiers and deleted by prune().
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=7 * 24 * 3600, persist_path=None, max_persisted=10000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.max_persisted = max_persisted
+        self._persisted = 0  # rows in the file, counted up on every write and recounted on trimming
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self._conn = None
+        if persist_path:
+            self._conn = sqlite3.connect(persist_path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_created_at ON response_cache (created_at)")
+            self._conn.commit()
+            self._persisted = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0], now):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._conn is not None:
+                row = self._conn.execute("SELECT created_at, value FROM response_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[0], now):
+                    entry = (row[0], row[1])
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        entry = (time.time(), value)
+        with self._lock:
+            self._store(key, entry)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, value, entry[0])
+                )
+                self._persisted += 1
+                if self.max_persisted is not None and self._persisted > self.max_persisted:
+                    self._trim()
+                self._conn.commit()
+
+    def _trim(self):
+        """Deletes the oldest persisted entries beyond max_persisted."""
+        self._conn.execute(
+            "DELETE FROM response_cache WHERE key IN "
+            "(SELECT key FROM response_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_persisted,)
+        )
+        self._persisted = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def prune(self):
+        """Drops expired entries from both tiers and trims the file to max_persisted entries."""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (created_at, _) in self._entries.items() if self._expired(created_at, now)]:
+                del self._entries[key]
+            if self._conn is not None and self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM response_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            if self._conn is not None:
+                if self.max_persisted is not None:
+                    self._trim()
+                else:
+                    self._persisted = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+                self._conn.commit()
+
+    @property
+    def nbytes(self):
+        """Approximate memory used: ~1 KiB per entry held in memory."""
+        return len(self._entries) * 1024
+
+    def close(self):
+        """Closes the file. The cache keeps working in memory only, for requests still using it."""
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+
+    def stats(self):
+        return {"entries": len(self._entries), "persisted": self._persisted, "hits": self.hits, "misses": self.misses}
+
+
+class SemanticCache:
+    """
+    Answer cache for informational queries, keyed by query meaning rather than exact text.
+
+    A lookup hits when a cached query embedding is within `threshold` cosine similarity of the
+    new one and the context chunks retrieved for the new query are the same ones the cached
+    answer was generated from. Embeddings are kept in one preallocated float32 matrix, so a
+    lookup is a single matrix-vector product. At most max_entries answers are kept (least
+    recently used evicted first), and everything is dropped when the knowledge base version
+    changes, i.e. after re-ingestion.
+    """
+
+    def __init__(self, max_entries=512, threshold=0.92, ttl_seconds=24 * 3600):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._clear(dimension=0)
+
+    def _clear(self, dimension):
+        self._matrix = np.zeros((self.max_entries, dimension), dtype=np.float32)
+        self._entries = [None] * self.max_entries  # slot -> (context_key, answer, created_at)
+        self._lru = OrderedDict()                  # slot -> None, least recently used first
+
+    def _check_version(self, version, dimension):
+        if version != self._version or dimension != self._matrix.shape[1]:
+            if self._lru:
+                self.invalidations += 1
+            self._version = version
+            self._clear(dimension)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, query_embedding, context_key, version=None):
+        """Returns a cached answer for a semantically equivalent query with the same context, or None."""
+        query = self._normalize(query_embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(version, query.shape[0])
+            if self._lru:
+                slots = np.fromiter(self._lru, dtype=np.int64, count=len(self._lru))
+                scores = self._matrix[slots] @ query
+                for i in np.argsort(scores)[::-1]:
+                    if scores[i] < self.threshold:
+                        break
+                    slot = int(slots[i])
+                    cached_context, answer, created_at = self._entries[slot]
+                    if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                        continue
+                    if cached_context == context_key:
+                        self._lru.move_to_end(slot)
+                        self.hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def set(self, query_embedding, context_key, answer, version=None):
+        if self.max_entries <= 0:
+            return
+        query = self._normalize(query_embedding)
+        with self._lock:
+            self._check_version(version, query.shape[0])
+            if len(self._lru) < self.max_entries:
+                slot = len(self._lru)
+            else:
+                slot, _ = self._lru.popitem(last=False)
+            self._matrix[slot] = query
+            self._entries[slot] = (context_key, answer, time.time())
+            self._lru[slot] = None
+
+    @property
+    def nbytes(self):
+        """Approximate memory used: the embedding matrix plus ~1 KiB per cached answer."""
+        return int(self._matrix.nbytes + len(self._lru) * 1024)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold,
+        }
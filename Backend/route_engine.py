@@ -0,0 +1,306 @@
+import sys
+import math
+import json
+import heapq
+import sqlite3
+import logging
+from collections import namedtuple
+import numpy as np
+from db_pool import table_exists
+from reloading import ReloadingIndex
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+WALKING_SPEED_MPS = 1.35       # ~4.9 km/h, a typical walking pace
+FALLBACK_NEIGHBOURS = 4        # edges per building when no footpath data has been imported
+PRECOMPUTE_LIMIT = 200         # precompute shortest-path trees for campuses up to this many buildings
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def is_valid_coordinate(lat, lng):
+    return lat is not None and lng is not None and -90 <= lat <= 90 and -180 <= lng <= 180
+
+
+# --- Schema ---
+def create_path_tables(conn):
+    """Creates the footpath graph tables next to buildings. Edges are undirected and stored once."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS path_nodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            UNIQUE (lat, lng)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS path_edges (
+            from_node INTEGER NOT NULL,
+            to_node INTEGER NOT NULL,
+            distance_m REAL NOT NULL,
+            PRIMARY KEY (from_node, to_node),
+            FOREIGN KEY (from_node) REFERENCES path_nodes (id),
+            FOREIGN KEY (to_node) REFERENCES path_nodes (id)
+        )
+    """)
+
+
+def import_paths_geojson(conn, path):
+    """
+    Imports footpaths from a GeoJSON file of LineString / MultiLineString features.
+    Vertices with the same coordinates (to 6 decimal places, ~10 cm) become one graph node,
+    and each consecutive pair of vertices becomes an edge. Returns (nodes, edges) added.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f).get("features", [])
+
+    lines = []
+    for feature in features:
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "LineString":
+            lines.append(geometry["coordinates"])
+        elif geometry.get("type") == "MultiLineString":
+            lines.extend(geometry["coordinates"])
+
+    create_path_tables(conn)
+    node_ids = {}
+    nodes_before = conn.execute("SELECT COUNT(*) FROM path_nodes").fetchone()[0]
+    edges_before = conn.execute("SELECT COUNT(*) FROM path_edges").fetchone()[0]
+    with conn:
+        def node_id(lng, lat):
+            key = (round(lat, 6), round(lng, 6))
+            if key not in node_ids:
+                conn.execute("INSERT OR IGNORE INTO path_nodes (lat, lng) VALUES (?, ?)", key)
+                node_ids[key] = conn.execute("SELECT id FROM path_nodes WHERE lat = ? AND lng = ?", key).fetchone()[0]
+            return node_ids[key], key
+
+        for line in lines:
+            previous = None
+            for lng, lat, *_ in line:
+                if not is_valid_coordinate(lat, lng):
+                    raise ValueError(f"Invalid footpath coordinate ({lat}, {lng}) in {path}.")
+                current = node_id(lng, lat)
+                if previous is not None and previous[0] != current[0]:
+                    a, b = sorted((previous, current))
+                    conn.execute(
+                        "INSERT OR IGNORE INTO path_edges (from_node, to_node, distance_m) VALUES (?, ?, ?)",
+                        (a[0], b[0], haversine_m(*a[1], *b[1]))
+                    )
+                previous = current
+    return (conn.execute("SELECT COUNT(*) FROM path_nodes").fetchone()[0] - nodes_before,
+            conn.execute("SELECT COUNT(*) FROM path_edges").fetchone()[0] - edges_before)
+
+
+# --- Route Engine ---
+# Everything a route lookup reads, replaced as one object on reload so routes computed on the
+# worker pool never mix nodes, snaps and trees from different builds. `routes` memoises on-demand
+# A* results: (from name, to name) -> route.
+RouteGraph = namedtuple("RouteGraph", ["approximate", "node_coords", "adjacency", "building_nodes", "buildings", "trees", "routes"])
+EMPTY_GRAPH = RouteGraph(True, {}, {}, {}, {}, {}, {})
+
+
+class RouteEngine(ReloadingIndex):
+    """
+    Server-side walking routes between buildings.
+
+    The footpath graph is loaded from path_nodes/path_edges; every building is snapped to its
+    nearest graph node, and routes are found with A* using a haversine heuristic. For campuses
+    with up to PRECOMPUTE_LIMIT buildings, a shortest-path tree is precomputed from every building
+    when the graph loads, so route responses are dictionary lookups. If no footpaths have been
+    imported yet, an approximate graph linking each building to its nearest neighbours is used.
+    Everything is reloaded when the database file changes on disk.
+    """
+
+    def __init__(self, database_file, precompute=True):
+        super().__init__(database_file)
+        self.precompute = precompute
+        # node_coords: node id -> (lat, lng); adjacency: node id -> [(neighbour id, metres)];
+        # building_nodes: building name -> (node id, snap distance in metres);
+        # buildings: building name -> (lat, lng); trees: building name -> (distances, predecessors)
+        self._graph = EMPTY_GRAPH
+
+    @property
+    def approximate(self):
+        return self._graph.approximate
+
+    @property
+    def node_coords(self):
+        return self._graph.node_coords
+
+    @property
+    def trees(self):
+        return self._graph.trees
+
+    # --- Building the graph ---
+    def build(self, conn):
+        buildings = {
+            name: (lat, lng) for name, lat, lng in conn.execute("SELECT name, lat, lng FROM buildings")
+            if is_valid_coordinate(lat, lng)
+        }
+        has_paths = table_exists(conn, "path_edges")
+        nodes = conn.execute("SELECT id, lat, lng FROM path_nodes").fetchall() if has_paths else []
+        edges = conn.execute("SELECT from_node, to_node, distance_m FROM path_edges").fetchall() if has_paths else []
+
+        if nodes and edges:
+            approximate = False
+            node_coords = {node_id: (lat, lng) for node_id, lat, lng in nodes}
+            adjacency = {node_id: [] for node_id in node_coords}
+            for a, b, distance in edges:
+                adjacency[a].append((b, distance))
+                adjacency[b].append((a, distance))
+        else:
+            approximate = True
+            node_coords, adjacency = self._fallback_graph(buildings)
+
+        building_nodes = self._snap(buildings, node_coords)
+        trees = {}
+        if self.precompute and len(buildings) <= PRECOMPUTE_LIMIT:
+            trees = {name: self._dijkstra(adjacency, node) for name, (node, _) in building_nodes.items()}
+        self._graph = RouteGraph(approximate, node_coords, adjacency, building_nodes, buildings, trees, {})
+        logger.info("Route graph ready", extra={"nodes": len(node_coords),
+                                                "edges": sum(len(v) for v in adjacency.values()) // 2,
+                                                "buildings": len(buildings),
+                                                "graph": "approximate" if approximate else "footpaths"})
+
+    @staticmethod
+    def _fallback_graph(buildings):
+        """Approximate graph: building i is node -(i + 1), linked to its nearest buildings."""
+        names = list(buildings)
+        node_coords = {-(i + 1): buildings[name] for i, name in enumerate(names)}
+        adjacency = {node: [] for node in node_coords}
+        for node, (lat, lng) in node_coords.items():
+            distances = sorted(
+                (haversine_m(lat, lng, *coords), other) for other, coords in node_coords.items() if other != node
+            )
+            for distance, other in distances[:FALLBACK_NEIGHBOURS]:
+                if all(existing != other for existing, _ in adjacency[node]):
+                    adjacency[node].append((other, distance))
+                    adjacency[other].append((node, distance))
+        return node_coords, adjacency
+
+    @staticmethod
+    def _snap(buildings, node_coords):
+        """Maps every building to its nearest graph node (vectorised haversine over all nodes)."""
+        if not node_coords or not buildings:
+            return {}
+        ids = np.fromiter(node_coords, dtype=np.int64)
+        coords = np.radians(np.array([node_coords[i] for i in ids]))
+        snapped = {}
+        for name, (lat, lng) in buildings.items():
+            phi, lam = math.radians(lat), math.radians(lng)
+            a = (np.sin((coords[:, 0] - phi) / 2) ** 2
+                 + np.cos(phi) * np.cos(coords[:, 0]) * np.sin((coords[:, 1] - lam) / 2) ** 2)
+            distances = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+            best = int(np.argmin(distances))
+            snapped[name] = (int(ids[best]), float(distances[best]))
+        return snapped
+
+    # --- Shortest paths ---
+    @staticmethod
+    def _dijkstra(adjacency, source):
+        distances, predecessors = {source: 0.0}, {}
+        heap = [(0.0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            for neighbour, weight in adjacency[node]:
+                candidate = distance + weight
+                if candidate < distances.get(neighbour, math.inf):
+                    distances[neighbour] = candidate
+                    predecessors[neighbour] = node
+                    heapq.heappush(heap, (candidate, neighbour))
+        return distances, predecessors
+
+    @staticmethod
+    def _astar(graph, source, goal):
+        goal_lat, goal_lng = graph.node_coords[goal]
+
+        def heuristic(node):
+            return haversine_m(*graph.node_coords[node], goal_lat, goal_lng)
+
+        distances, predecessors = {source: 0.0}, {}
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, distance, node = heapq.heappop(heap)
+            if node == goal:
+                return distance, predecessors
+            if distance > distances[node]:
+                continue
+            for neighbour, weight in graph.adjacency[node]:
+                candidate = distance + weight
+                if candidate < distances.get(neighbour, math.inf):
+                    distances[neighbour] = candidate
+                    predecessors[neighbour] = node
+                    heapq.heappush(heap, (candidate + heuristic(neighbour), candidate, neighbour))
+        return None, predecessors
+
+    @staticmethod
+    def _walk_back(predecessors, source, goal):
+        nodes = [goal]
+        while nodes[-1] != source:
+            nodes.append(predecessors[nodes[-1]])
+        return nodes[::-1]
+
+    def route(self, from_name, to_name):
+        """
+        Returns {"polyline", "distance_m", "walking_minutes", "approximate"} for a walking route
+        between two buildings, or None if either building can't be placed on the graph.
+        """
+        self.ensure_fresh()
+        graph = self._graph
+        if from_name not in graph.building_nodes or to_name not in graph.building_nodes:
+            return None
+        if (from_name, to_name) in graph.routes:
+            return graph.routes[(from_name, to_name)]
+
+        source, source_snap = graph.building_nodes[from_name]
+        goal, goal_snap = graph.building_nodes[to_name]
+        if from_name in graph.trees:
+            distances, predecessors = graph.trees[from_name]
+            graph_distance = distances.get(goal)
+        else:
+            graph_distance, predecessors = self._astar(graph, source, goal)
+        if graph_distance is None:
+            return None
+
+        nodes = self._walk_back(predecessors, source, goal)
+        polyline = [list(graph.buildings[from_name])]
+        polyline += [list(graph.node_coords[node]) for node in nodes if list(graph.node_coords[node]) != polyline[-1]]
+        if list(graph.buildings[to_name]) != polyline[-1]:
+            polyline.append(list(graph.buildings[to_name]))
+        distance = graph_distance + source_snap + goal_snap
+        result = {
+            "polyline": polyline,
+            "distance_m": round(distance, 1),
+            "walking_minutes": round(distance / WALKING_SPEED_MPS / 60, 1),
+            "approximate": graph.approximate,
+        }
+        if len(graph.routes) < 10000:
+            graph.routes[(from_name, to_name)] = result
+        return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "import-paths":
+        database_file = sys.argv[3] if len(sys.argv) > 3 else "campus.db"
+        conn = sqlite3.connect(database_file)
+        try:
+            added_nodes, added_edges = import_paths_geojson(conn, sys.argv[2])
+        finally:
+            conn.close()
+        print(f"Imported {added_nodes} footpath nodes and {added_edges} edges into '{database_file}'.")
+    elif len(sys.argv) >= 3:
+        engine = RouteEngine("campus.db")
+        print(json.dumps(engine.route(sys.argv[1], sys.argv[2]), indent=2))
+    else:
+        print("Usage: python route_engine.py import-paths <paths.geojson> [campus.db]")
+        print("       python route_engine.py <from building> <to building>")
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import logging
+import sqlite3
+import argparse
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Runtime Snapshot ---
+# Everything a worker needs in memory to start answering queries (the alias map, the building
+# records with their tags and the normalised embedding matrix) is precomputed into one file next
+# to the database. A cold worker memory-maps it instead of querying SQLite, decoding embedding
+# BLOBs and normalising them: the matrix is used in place from the page cache, and chunk texts
+# are only decoded when a search returns them.
+#
+# Layout: MAGIC | u64 header length | JSON header | padding | float32 matrix | int64 ids |
+#         int64 text offsets | UTF-8 chunk texts. Sections start on 64-byte boundaries.
+#
+# The header records the database fingerprint (file size and SQLite's file change counter, which
+# every committed write increments), so a snapshot is only used while the database is unchanged,
+# even after the files are copied into an image. A stale snapshot is ignored and the indexes
+# load from SQLite as before.
+
+MAGIC = b"MMCSNAP1"
+LENGTH = struct.Struct("<Q")
+ALIGNMENT = 64
+
+
+def snapshot_path(database_file):
+    """Sidecar file the snapshot is written to, next to the database."""
+    return os.path.splitext(database_file)[0] + ".snapshot"
+
+
+def database_fingerprint(database_file):
+    """(size, file change counter) of a SQLite database, or None if it doesn't exist."""
+    try:
+        with open(database_file, "rb") as f:
+            header = f.read(100)
+            size = os.fstat(f.fileno()).st_size
+    except FileNotFoundError:
+        return None
+    if len(header) < 28:
+        return [size, None]
+    return [size, struct.unpack(">I", header[24:28])[0]]
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+# --- Building ---
+def build_snapshot(database_file, path=None):
+    """Writes the runtime snapshot for database_file (atomically) and returns its path."""
+    from alias_matcher import load_aliases
+    from spatial_index import load_tagged_buildings
+    from vector_index import load_embeddings
+
+    path = path or snapshot_path(database_file)
+    start = time.perf_counter()
+    fingerprint = database_fingerprint(database_file)
+    conn = sqlite3.connect(database_file)
+    conn.row_factory = sqlite3.Row
+    try:
+        buildings_by_alias = load_aliases(conn)
+        buildings = load_tagged_buildings(conn)
+        ids, contents, matrix = load_embeddings(conn)
+    finally:
+        conn.close()
+
+    texts = [content.encode("utf-8") for content in contents]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=offsets[1:])
+    sections = [("matrix", np.ascontiguousarray(matrix, dtype=np.float32).tobytes()),
+                ("ids", ids.astype(np.int64).tobytes()),
+                ("offsets", offsets.tobytes()),
+                ("texts", b"".join(texts))]
+
+    header = {
+        "fingerprint": fingerprint,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "vectors": len(contents),
+        "dimension": int(matrix.shape[1]) if matrix.ndim == 2 and len(contents) else 0,
+        "buildings": buildings,
+        "buildings_by_alias": buildings_by_alias,
+        "sections": {},
+    }
+    # Section offsets depend on the header length, which depends on the offsets: reserve room for
+    # them by sizing the header with generous placeholder offsets first.
+    header["sections"] = {name: [10 ** 15, len(data)] for name, data in sections}
+    position = _aligned(len(MAGIC) + LENGTH.size + len(json.dumps(header).encode("utf-8")))
+    for name, data in sections:
+        header["sections"][name] = [position, len(data)]
+        position = _aligned(position + len(data))
+    encoded = json.dumps(header).encode("utf-8")
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC + LENGTH.pack(len(encoded)) + encoded)
+        for name, data in sections:
+            f.seek(header["sections"][name][0])
+            f.write(data)
+        f.truncate(position)
+    os.replace(temporary, path)
+    logger.info("Wrote runtime snapshot", extra={"path": path, "buildings": len(buildings),
+                                                 "aliases": len(buildings_by_alias), "vectors": len(contents),
+                                                 "bytes": position,
+                                                 "duration_ms": round((time.perf_counter() - start) * 1000, 3)})
+    return path
+
+
+# --- Loading ---
+class MappedTexts:
+    """Read-only sequence of strings stored back to back in a mapped buffer, decoded on access."""
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self.buffer[int(self.offsets[index]):int(self.offsets[index + 1])], "utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def nbytes(self):
+        return int(self.offsets[-1]) if len(self.offsets) else 0
+
+
+class RuntimeSnapshot:
+    """A memory-mapped snapshot file. The arrays are views into the mapping, not copies."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"'{path}' is not a runtime snapshot.")
+        (length,) = LENGTH.unpack_from(buffer, len(MAGIC))
+        start = len(MAGIC) + LENGTH.size
+        header = json.loads(bytes(buffer[start:start + length]))
+
+        def section(name, dtype):
+            offset, size = header["sections"][name]
+            return np.frombuffer(self._mmap, dtype=dtype, count=size // np.dtype(dtype).itemsize, offset=offset)
+
+        self.path = path
+        self.fingerprint = header["fingerprint"]
+        self.buildings = header["buildings"]
+        self.buildings_by_alias = header["buildings_by_alias"]
+        self.ids = section("ids", np.int64)
+        self.matrix = section("matrix", np.float32).reshape(header["vectors"], header["dimension"])
+        offset, size = header["sections"]["texts"]
+        self.contents = MappedTexts(buffer[offset:offset + size], section("offsets", np.int64))
+
+    def close(self):
+        """Unmaps the file, or leaves that to garbage collection while an index still holds views into it."""
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+
+class SnapshotCache:
+    """
+    The current RuntimeSnapshot of one database, mapped once and shared by that database's indexes.
+
+    Each tenant owns one, so the mapping and the decoded building and alias records go away with the
+    tenant: close() drops them when it is evicted. get() re-maps the file after it is rebuilt.
+    """
+
+    def __init__(self, database_file):
+        self.database_file = database_file
+        self._entry = None  # (snapshot file signature, database fingerprint, RuntimeSnapshot or None)
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The snapshot if one exists and matches the database's current contents, else None."""
+        path = snapshot_path(self.database_file)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        fingerprint = database_fingerprint(self.database_file)
+        with self._lock:
+            if self._entry is not None and self._entry[0] == signature and self._entry[1] == fingerprint:
+                return self._entry[2]
+            try:
+                snapshot = RuntimeSnapshot(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Could not read runtime snapshot; loading from the database", extra={"path": path, "error": str(e)})
+                snapshot = None
+            if snapshot is not None and snapshot.fingerprint != fingerprint:
+                logger.warning("Runtime snapshot is out of date; loading from the database "
+                               "(run 'python snapshot.py build' to refresh it)", extra={"path": path})
+                snapshot = None
+            self._entry = (signature, fingerprint, snapshot)
+            return snapshot
+
+    def close(self):
+        with self._lock:
+            entry, self._entry = self._entry, None
+        if entry is not None and entry[2] is not None:
+            entry[2].close()
+
+
+def load_snapshot(database_file):
+    """The RuntimeSnapshot for database_file if one exists and is current, else None (mapped anew on every call)."""
+    return SnapshotCache(database_file).get()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect the memory-mapped runtime snapshot.")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--database", default="campus.db")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "build":
+        build_snapshot(args.database)
+    start = time.perf_counter()
+    snapshot = load_snapshot(args.database)
+    if snapshot is None:
+        sys.exit(f"No usable snapshot for '{args.database}'.")
+    print(f"{snapshot.path}: {len(snapshot.buildings)} buildings, {len(snapshot.buildings_by_alias)} aliases, "
+          f"{len(snapshot.contents)} vectors of dimension {snapshot.matrix.shape[1] if snapshot.matrix.size else 0} "
+          f"(mapped in {(time.perf_counter() - start) * 1000:.2f} ms)")
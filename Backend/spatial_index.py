@@ -0,0 +1,219 @@
+import math
+import heapq
+import logging
+from collections import namedtuple
+import numpy as np
+from db_pool import table_exists
+from reloading import ReloadingIndex
+from route_engine import EARTH_RADIUS_M, is_valid_coordinate
+
+
+logger = logging.getLogger(__name__)
+
+
+def to_unit_vectors(lat, lng):
+    """Maps latitude/longitude (degrees) to points on the unit sphere."""
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+def chord_to_metres(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+def metres_to_chord(metres):
+    return 2 * math.sin(min(metres / EARTH_RADIUS_M, math.pi) / 2)
+
+
+class KDTree:
+    """
+    Static 3-d tree over points on the unit sphere.
+
+    Straight-line (chord) distance between unit vectors grows monotonically with great-circle
+    distance, so nearest-neighbour and radius queries in 3-d give exact geographic answers
+    without special-casing the antimeridian or poles. Queries visit O(log n) nodes on average.
+    """
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.order = np.arange(len(self.points))
+        # The tree is implicit: node (lo, hi) holds self.order[(lo + hi) // 2] and splits on _axes[(lo, hi)]
+        self._axes = {}
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def _build(self, lo, hi):
+        if hi - lo <= 1:
+            return
+        segment = self.order[lo:hi]
+        axis = int(np.argmax(np.ptp(self.points[segment], axis=0)))
+        mid = (lo + hi) // 2
+        self.order[lo:hi] = segment[np.argpartition(self.points[segment, axis], mid - lo)]
+        self._axes[(lo, hi)] = axis
+        self._build(lo, mid)
+        self._build(mid + 1, hi)
+
+    def _visit(self, lo, hi, target, visit, bound):
+        """Depth-first traversal of the implicit tree; `bound()` returns the current pruning radius."""
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        index = self.order[mid]
+        visit(index, float(np.linalg.norm(self.points[index] - target)))
+        if hi - lo == 1:
+            return
+        axis = self._axes[(lo, hi)]
+        delta = target[axis] - self.points[index][axis]
+        near, far = ((lo, mid), (mid + 1, hi)) if delta < 0 else ((mid + 1, hi), (lo, mid))
+        self._visit(*near, target, visit, bound)
+        if abs(delta) <= bound():
+            self._visit(*far, target, visit, bound)
+
+    def nearest(self, target, k):
+        """Returns [(chord distance, point index)] of the k nearest points, closest first."""
+        heap = []  # max-heap via negated distances
+
+        def visit(index, distance):
+            if len(heap) < k:
+                heapq.heappush(heap, (-distance, index))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, index))
+
+        def bound():
+            return -heap[0][0] if len(heap) == k else math.inf
+
+        if k > 0:
+            self._visit(0, len(self.points), np.asarray(target), visit, bound)
+        return sorted((-d, i) for d, i in heap)
+
+    def within(self, target, radius):
+        """Returns [(chord distance, point index)] of every point within `radius` (chord), closest first."""
+        found = []
+
+        def visit(index, distance):
+            if distance <= radius:
+                found.append((distance, index))
+
+        self._visit(0, len(self.points), np.asarray(target), visit, lambda: radius)
+        return sorted(found)
+
+
+# Building rows in point order, name -> building row, tag (None = all buildings) -> (KDTree,
+# [indices into buildings]), and the known tags; replaced as one object on rebuild so concurrent
+# queries see a single build.
+SpatialState = namedtuple("SpatialState", ["buildings", "by_name", "trees", "tags"])
+
+
+def load_tagged_buildings(conn):
+    """Every buildings row as a dict, with its sorted category tags under 'tags'."""
+    if not table_exists(conn, "buildings"):
+        logger.warning("'buildings' table not found.")
+        return []
+    cursor = conn.execute("SELECT * FROM buildings ORDER BY id")
+    columns = [column[0] for column in cursor.description]
+    buildings = [dict(zip(columns, row)) for row in cursor]
+    tags_by_building = {}
+    if table_exists(conn, "building_tags"):
+        for building_id, tag in conn.execute("SELECT building_id, tag FROM building_tags"):
+            tags_by_building.setdefault(building_id, []).append(tag)
+    for building in buildings:
+        building['tags'] = sorted(tags_by_building.get(building['id'], []))
+    return buildings
+
+
+class SpatialIndex(ReloadingIndex):
+    """
+    k-nearest and radius queries over the buildings table, with optional category tags.
+
+    One KD-tree is built over every building with valid coordinates, plus one per tag, so a
+    "nearest canteen" query only searches canteens. Rebuilt when the database file changes on disk,
+    from the runtime snapshot's building records when `snapshots` (a SnapshotCache) has a current one.
+    """
+
+    def __init__(self, database_file, snapshots=None):
+        super().__init__(database_file)
+        self.snapshots = snapshots
+        self._state = SpatialState([], {}, {}, set())
+
+    @property
+    def buildings(self):
+        return self._state.buildings
+
+    @property
+    def trees(self):
+        return self._state.trees
+
+    @property
+    def tags(self):
+        return self._state.tags
+
+    def reload(self):
+        snapshot = self.snapshots.get() if self.snapshots is not None else None
+        if snapshot is not None:
+            self.index(snapshot.buildings)
+        else:
+            super().reload()
+
+    def build(self, conn):
+        self.index(load_tagged_buildings(conn))
+
+    def index(self, buildings):
+        """Builds the trees over building records (dicts with lat, lng and a list of tags)."""
+        buildings = [dict(b) for b in buildings if is_valid_coordinate(b['lat'], b['lng'])]
+        members = {None: list(range(len(buildings)))}
+        for i, building in enumerate(buildings):
+            for tag in building['tags']:
+                members.setdefault(tag, []).append(i)
+
+        points = to_unit_vectors(np.array([b['lat'] for b in buildings], dtype=np.float64),
+                                 np.array([b['lng'] for b in buildings], dtype=np.float64))
+        trees = {tag: (KDTree(points[indices] if indices else np.empty((0, 3))), indices)
+                 for tag, indices in members.items()}
+        by_name = {building['name']: building for building in buildings}
+        self._state = SpatialState(buildings, by_name, trees, {tag for tag in members if tag is not None})
+
+    def get(self, name):
+        """The indexed building row for a name, or None if unknown or without valid coordinates."""
+        self.ensure_fresh()
+        return self._state.by_name.get(name)
+
+    def resolve_tag(self, text):
+        """Finds a known tag in free text ("canteens", "a guest house"), or None."""
+        self.ensure_fresh()
+        words = text.lower()
+        for tag in sorted(self.tags, key=len, reverse=True):
+            for form in (tag, tag + "s", tag + "es"):
+                if f" {form} " in f" {words} ":
+                    return tag
+        return None
+
+    @staticmethod
+    def _results(buildings, matches, indices, exclude):
+        results = []
+        for chord, point in matches:
+            building = buildings[indices[point]]
+            if building['name'] == exclude:
+                continue
+            results.append({**building, "distance_m": round(float(chord_to_metres(chord)), 1)})
+        return results
+
+    def nearest(self, lat, lng, k=5, tag=None, exclude=None):
+        """The k buildings closest to (lat, lng), optionally only those tagged `tag`."""
+        self.ensure_fresh()
+        state = self._state
+        if tag not in state.trees:
+            return []
+        tree, indices = state.trees[tag]
+        extra = 1 if exclude else 0
+        matches = tree.nearest(to_unit_vectors(lat, lng), k + extra)
+        return self._results(state.buildings, matches, indices, exclude)[:k]
+
+    def within(self, lat, lng, radius_m, tag=None, exclude=None):
+        """Every building within radius_m metres of (lat, lng), closest first."""
+        self.ensure_fresh()
+        state = self._state
+        if tag not in state.trees:
+            return []
+        tree, indices = state.trees[tag]
+        matches = tree.within(to_unit_vectors(lat, lng), metres_to_chord(radius_m))
+        return self._results(state.buildings, matches, indices, exclude)
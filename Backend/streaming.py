@@ -0,0 +1,48 @@
+import json
+import asyncio
+import contextlib
+
+# --- Server-Sent Events ---
+# Helpers for text/event-stream responses: each event is "event: <name>\ndata: <json>\n\n", and
+# comment lines (": ...") keep idle connections from being closed by proxies and browsers.
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # stop nginx-style proxies from buffering the stream
+}
+
+
+def sse_event(event, data):
+    """Formats one SSE event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def with_keepalive(events, interval=15.0):
+    """
+    Re-yields an async iterator of SSE strings, inserting a keep-alive comment whenever nothing
+    has been sent for `interval` seconds.
+
+    The source is advanced in its own task so a slow step (retrieval, the first token from the
+    model) is never interrupted by a keep-alive. When the consumer stops early (the client
+    disconnected, so the response stops iterating or is cancelled), that task is cancelled,
+    which raises CancelledError inside the source and stops any in-flight generation.
+    """
+    iterator = events.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield ": keep-alive\n\n"
+                continue
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                return
+            yield event
+            pending = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        if not pending.done():
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
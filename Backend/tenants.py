@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import contextvars
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# --- Tenants ---
+# One deployment can serve several campuses. Each campus (tenant) has its own directory with its
+# own database and data files:
+#
+#   tenants/<tenant id>/campus.db        buildings, aliases, footpaths and knowledge base
+#   tenants/<tenant id>/Data/            buildings.csv and the .txt files for ingest_data.py
+#   tenants/<tenant id>/tenant.json      optional: {"name": "...", "greeting": "..."}
+#
+# The original single-campus setup (campus.db next to main.py) is the "default" tenant. A
+# tenant's indexes, connection pool and caches are created on its first request and
+# evicted (least recently used first) when the loaded tenants exceed a memory budget, so
+# workers only keep the campuses that are actually being queried in memory.
+
+DEFAULT_TENANT = "default"
+TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+TenantInfo = namedtuple("TenantInfo", ["id", "name", "database_file", "data_dir", "greeting"])
+
+# The tenant the current request is for; set by the API handlers, read by the query pipeline.
+current_tenant_var = contextvars.ContextVar("current_tenant", default=None)
+
+
+def greeting_for(name):
+    return f"Hello! How can I help you with {name} today?"
+
+
+def tenant_paths(tenants_dir, tenant_id):
+    """(database file, data directory) of a tenant under tenants_dir."""
+    if not TENANT_ID.match(tenant_id):
+        raise ValueError(f"Invalid tenant id '{tenant_id}': use lower-case letters, digits, '-' and '_'.")
+    root = os.path.join(tenants_dir, tenant_id)
+    return os.path.join(root, "campus.db"), os.path.join(root, "Data")
+
+
+def discover_tenants(tenants_dir):
+    """TenantInfo for every tenants_dir/<id>/ that has a campus.db, by id."""
+    found = {}
+    if not tenants_dir or not os.path.isdir(tenants_dir):
+        return found
+    for tenant_id in sorted(os.listdir(tenants_dir)):
+        if not TENANT_ID.match(tenant_id) or tenant_id == DEFAULT_TENANT:
+            continue
+        database_file, data_dir = tenant_paths(tenants_dir, tenant_id)
+        if not os.path.exists(database_file):
+            continue
+        settings = {}
+        settings_file = os.path.join(tenants_dir, tenant_id, "tenant.json")
+        if os.path.exists(settings_file):
+            try:
+                with open(settings_file, "r", encoding="utf-8") as f:
+                    settings = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable tenant settings", extra={"path": settings_file, "error": str(e)})
+        name = settings.get("name", tenant_id)
+        found[tenant_id] = TenantInfo(tenant_id, name, database_file, data_dir, settings.get("greeting", greeting_for(name)))
+    return found
+
+
+class Tenant:
+    """
+    The loaded state of one campus: its info plus the indexes, pool and caches built for it, and the
+    runtime snapshot mapping its indexes share (None when they load from SQLite only).
+    """
+
+    def __init__(self, info, knowledge_index, alias_matcher, route_engine, spatial_index, db_pool, answer_cache,
+                 description_cache, snapshots=None):
+        self.info = info
+        self.knowledge_index = knowledge_index
+        self.alias_matcher = alias_matcher
+        self.route_engine = route_engine
+        self.spatial_index = spatial_index
+        self.db_pool = db_pool
+        self.answer_cache = answer_cache
+        self.description_cache = description_cache
+        self.snapshots = snapshots
+        self.loaded_at = time.time()
+
+    @property
+    def id(self):
+        return self.info.id
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held for this tenant: the knowledge matrix and texts, the answer and
+        description caches, and a per-entry estimate for the alias, spatial and route structures.
+        """
+        aliases = len(self.alias_matcher.buildings_by_alias) * 512
+        buildings = len(self.spatial_index.buildings) * 1024
+        routes = len(self.route_engine.trees) * len(self.route_engine.node_coords) * 160
+        caches = self.answer_cache.nbytes + self.description_cache.nbytes
+        return self.knowledge_index.nbytes + caches + aliases + buildings + routes
+
+    def close(self):
+        """Releases what the tenant holds outside the Python heap: its connections and its snapshot mapping."""
+        self.db_pool.close()
+        self.description_cache.close()
+        if self.snapshots is not None:
+            self.snapshots.close()
+
+
+class TenantRegistry:
+    """
+    Looks up tenants by id and keeps the recently used ones loaded.
+
+    `factory(info)` builds a Tenant; it is called on a tenant's first request (and again after
+    the tenant was evicted). After each lookup, least recently used tenants are evicted until the
+    loaded ones fit in memory_budget_bytes; the tenant just requested is never evicted. Tenant
+    directories added while the server runs are picked up when an unknown id is requested, by a
+    rescan at most every refresh_interval seconds (so repeated unknown ids don't each list the directory).
+    """
+
+    def __init__(self, factory, default, tenants_dir=None, memory_budget_bytes=None, refresh_interval=30.0):
+        self.factory = factory
+        self.default = default
+        self.tenants_dir = tenants_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.refresh_interval = refresh_interval
+        self._refreshed_at = None
+        self.loads = 0
+        self.evictions = 0
+        self._known = {}
+        self._loaded = OrderedDict()  # tenant id -> Tenant, least recently used first
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Rescans tenants_dir for tenants."""
+        known = {DEFAULT_TENANT: self.default, **discover_tenants(self.tenants_dir)}
+        with self._lock:
+            self._known = known
+            self._refreshed_at = time.monotonic()
+
+    def known(self):
+        return dict(self._known)
+
+    def get(self, tenant_id=None):
+        """The loaded Tenant for tenant_id (None = the default tenant). Raises KeyError if unknown."""
+        tenant_id = (tenant_id or DEFAULT_TENANT).lower()
+        with self._lock:
+            unknown = tenant_id not in self._loaded and tenant_id not in self._known
+            stale = time.monotonic() - self._refreshed_at >= self.refresh_interval
+        if unknown and stale and TENANT_ID.match(tenant_id):
+            self.refresh()
+
+        with self._lock:
+            tenant = self._loaded.get(tenant_id)
+            if tenant is None:
+                info = self._known.get(tenant_id)
+                if info is None:
+                    raise KeyError(tenant_id)
+                tenant = self.factory(info)
+                self._loaded[tenant_id] = tenant
+                self.loads += 1
+                logger.info("Loaded tenant", extra={"tenant": tenant_id})
+            self._loaded.move_to_end(tenant_id)
+            evicted = self._over_budget(keep=tenant_id)
+        for old in evicted:
+            old.close()
+        return tenant
+
+    def _over_budget(self, keep):
+        """
+        Removes least recently used tenants (never `keep`) while over the budget and returns them.
+        Indexes load after their tenant is looked up, so this runs on every lookup (Tenant.nbytes
+        is a few attribute reads per tenant).
+        """
+        if self.memory_budget_bytes is None:
+            return []
+        evicted = []
+        total = sum(tenant.nbytes for tenant in self._loaded.values())
+        for tenant_id in list(self._loaded):
+            if total <= self.memory_budget_bytes:
+                break
+            if tenant_id == keep:
+                continue
+            tenant = self._loaded.pop(tenant_id)
+            total -= tenant.nbytes
+            evicted.append(tenant)
+            self.evictions += 1
+            logger.info("Evicted tenant to stay within the memory budget", extra={"tenant": tenant_id})
+        return evicted
+
+    def loaded(self):
+        with self._lock:
+            return list(self._loaded.values())
+
+    def stats(self):
+        loaded = {tenant.id: tenant for tenant in self.loaded()}
+        return {
+            "tenants": [
+                {"id": info.id, "name": info.name, "loaded": info.id in loaded,
+                 "loaded_at": loaded[info.id].loaded_at if info.id in loaded else None,
+                 "memory_bytes": loaded[info.id].nbytes if info.id in loaded else 0}
+                for info in self._known.values()
+            ],
+            "loaded": len(loaded),
+            "memory_bytes": sum(tenant.nbytes for tenant in loaded.values()),
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List tenants or print a tenant's database and data paths.")
+    parser.add_argument("command", choices=["list", "paths"])
+    parser.add_argument("tenant", nargs="?")
+    parser.add_argument("--tenants-dir", default=os.getenv("TENANTS_DIR", "tenants"))
+    args = parser.parse_args()
+
+    if args.command == "paths":
+        if not args.tenant:
+            sys.exit("Give a tenant id.")
+        try:
+            database_file, data_dir = tenant_paths(args.tenants_dir, args.tenant)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"database: {database_file}\ndata:     {data_dir}")
+    else:
+        for info in discover_tenants(args.tenants_dir).values():
+            print(f"{info.id:>20}  {info.name}  ({info.database_file})")
@@ -0,0 +1,95 @@
+import random
+import re
+import pytest
+from alias_matcher import AliasMatcher, FuzzyAliasIndex, allowed_edits, edit_distance
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def osa_distance(a, b):
+    """Full optimal-string-alignment table, without the band or early exit edit_distance uses."""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+def brute_force_lookup(aliases, span, max_edits):
+    """The smallest distance to any alias within its allowed edits (numbers must match), or None."""
+    numbers = re.findall(r"\d+", span)
+    best = None
+    for alias in aliases:
+        if abs(len(alias) - len(span)) > max_edits or re.findall(r"\d+", alias) != numbers:
+            continue
+        distance = osa_distance(span, alias)
+        if distance <= allowed_edits(len(alias), max_edits) and (best is None or distance < best):
+            best = distance
+    return best
+
+
+def mutate(rng, text, edits):
+    for _ in range(edits):
+        i = rng.randrange(len(text))
+        op = rng.randrange(4)
+        if op == 0 and len(text) > 1:
+            text = text[:i] + text[i + 1:]
+        elif op == 1:
+            text = text[:i] + rng.choice(LETTERS) + text[i:]
+        elif op == 2:
+            text = text[:i] + rng.choice(LETTERS) + text[i + 1:]
+        elif i + 1 < len(text):
+            text = text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    return text
+
+
+@pytest.fixture(scope="module")
+def aliases():
+    rng = random.Random(7)
+    words = ["".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 9))) for _ in range(300)]
+    generated = {" ".join(rng.sample(words, rng.randint(1, 2))) for _ in range(400)}
+    return sorted(generated | {"library", "ponmudi hostel", "phd hostel 3", "phd hostel 5", "lhc", "shops"})
+
+
+def test_edit_distance_matches_full_osa_within_the_bound():
+    rng = random.Random(3)
+    for _ in range(2000):
+        a = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 8)))
+        b = mutate(rng, a, rng.randint(0, 3)) if a else "ab"
+        for bound in range(3):
+            assert edit_distance(a, b, bound) == min(osa_distance(a, b), bound + 1)
+
+
+def test_fuzzy_lookup_matches_brute_force(aliases):
+    index = FuzzyAliasIndex(aliases, max_edits=2)
+    rng = random.Random(11)
+    checked = 0
+    for _ in range(600):
+        span = mutate(rng, rng.choice(aliases), rng.randint(1, 2))
+        expected = brute_force_lookup(index.aliases, span, 2)
+        result = index.lookup(span)
+        assert (result[0] if result else None) == expected, span
+        if result:
+            assert osa_distance(span, result[1]) == result[0]
+            checked += 1
+    assert checked > 150  # enough typos actually resolved for the comparison to mean something
+
+
+@pytest.mark.parametrize("typo, alias", [("lirbary", "library"), ("libary", "library"), ("ponmdui hostel", "ponmudi hostel")])
+def test_typos_resolve(aliases, typo, alias):
+    assert FuzzyAliasIndex(aliases).lookup(typo)[1] == alias
+
+
+@pytest.mark.parametrize("span", ["shows", "stops", "lhd", "phd hostel 7"])
+def test_short_aliases_and_numbers_need_exact_matches(aliases, span):
+    assert FuzzyAliasIndex(aliases).lookup(span) is None
+
+
+def test_matcher_falls_back_to_fuzzy_for_unmatched_words():
+    matcher = AliasMatcher(None)
+    matcher.compile({"library": ["Library"], "lhc": ["Lecture Hall Complex"], "shops": ["Shopping Centre"]})
+    assert matcher.find("where is the lirbary") == ["Library"]
+    assert matcher.find("route from lhc to the libary") == ["Lecture Hall Complex", "Library"]
+    assert matcher.find("what shows are on this week") == []
@@ -0,0 +1,64 @@
+import json
+import sqlite3
+import numpy as np
+import pytest
+from embedding_pipeline import FakeEmbedder
+from embedding_store import (blobs_to_matrix, decode_embedding, encode_embedding, is_legacy_format,
+                             migrate_knowledge_base)
+from vector_index import load_embeddings
+
+CHUNKS = ["The library opens at 8 am.", "The canteen serves lunch until 2 pm.", "The gym is next to the hostel."]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A knowledge_base in the original layout: embeddings as JSON text, with a gap in the ids."""
+    conn = sqlite3.connect(str(tmp_path / "campus.db"))
+    conn.execute("""
+        CREATE TABLE knowledge_base (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL,
+            embedding TEXT NOT NULL
+        )
+    """)
+    embedder = FakeEmbedder(dimension=16)
+    conn.executemany("INSERT INTO knowledge_base (id, content, embedding) VALUES (?, ?, ?)",
+                     [(row_id, text, json.dumps(embedder.embed_one(text).tolist()))
+                      for row_id, text in zip([1, 2, 5], CHUNKS)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_encode_decode_round_trip():
+    vector = FakeEmbedder(dimension=768).embed_one("library")
+    blob = encode_embedding(vector.tolist())
+    assert len(blob) == 4 + 768 * 4
+    assert np.array_equal(decode_embedding(blob), vector)
+
+
+def test_blobs_to_matrix_rejects_mixed_dimensions():
+    with pytest.raises(ValueError):
+        blobs_to_matrix([encode_embedding([0.0] * 4), encode_embedding([0.0] * 8)])
+
+
+def test_migration_round_trip(legacy_db):
+    legacy = {row_id: (content, json.loads(embedding))
+              for row_id, content, embedding in legacy_db.execute("SELECT id, content, embedding FROM knowledge_base")}
+    assert is_legacy_format(legacy_db)
+
+    assert migrate_knowledge_base(legacy_db) == 3
+    assert not is_legacy_format(legacy_db)
+    rows = legacy_db.execute("SELECT id, content, embedding FROM knowledge_base ORDER BY id").fetchall()
+    assert [row_id for row_id, _, _ in rows] == [1, 2, 5]
+    for row_id, content, blob in rows:
+        assert content == legacy[row_id][0]
+        assert np.array_equal(decode_embedding(blob), np.asarray(legacy[row_id][1], dtype=np.float32))
+
+    # The index reads the migrated rows as one normalised matrix, in id order
+    ids, contents, matrix = load_embeddings(legacy_db)
+    assert list(ids) == [1, 2, 5] and list(contents) == CHUNKS
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
+
+    # A second run is a no-op
+    assert migrate_knowledge_base(legacy_db) == 0
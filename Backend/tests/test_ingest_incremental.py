@@ -0,0 +1,120 @@
+import sqlite3
+import pytest
+from chunkers import Chunker
+from embedding_pipeline import FakeEmbedder
+from ingest_data import ingest_data, plan_incremental, split_into_chunks
+
+# The paragraph chunker needs no NLTK models, and one paragraph per chunk makes edits easy to aim.
+CHUNKER = Chunker("paragraph")
+
+CAMPUS = "The library opens at 8 am.\n\nThe canteen serves lunch until 2 pm.\n\nThe gym is next to the hostel."
+EVENTS = "Orientation is in August.\n\nThe fest is in January."
+
+
+@pytest.fixture
+def campus(tmp_path):
+    """A knowledge base ingested from two files; returns (database file, data directory)."""
+    data_dir = tmp_path / "Data"
+    data_dir.mkdir()
+    (data_dir / "campus.txt").write_text(CAMPUS, encoding="utf-8")
+    (data_dir / "events.txt").write_text(EVENTS, encoding="utf-8")
+    database_file = str(tmp_path / "campus.db")
+    ingest(database_file, data_dir, incremental=False)
+    return database_file, data_dir
+
+
+def ingest(database_file, data_dir, incremental=True):
+    ingest_data(embedder=FakeEmbedder(dimension=8), incremental=incremental, chunker=CHUNKER,
+                database_file=database_file, data_dir=str(data_dir))
+
+
+def plan(database_file, sources):
+    conn = sqlite3.connect(database_file)
+    try:
+        return plan_incremental(conn, sources, CHUNKER)
+    finally:
+        conn.close()
+
+
+def stored_rows(database_file):
+    conn = sqlite3.connect(database_file)
+    try:
+        return dict(((source, offset), (row_id, content)) for row_id, source, offset, content in
+                    conn.execute("SELECT id, source, chunk_offset, content FROM knowledge_base"))
+    finally:
+        conn.close()
+
+
+def row_id(database_file, content):
+    return next(row_id for row_id, text in stored_rows(database_file).values() if text == content)
+
+
+def test_unchanged_sources_plan_nothing(campus):
+    database_file, _ = campus
+    inserts, updates, moves, deletes, unchanged = plan(database_file, {"campus.txt": CAMPUS, "events.txt": EVENTS})
+    assert (inserts, updates, moves, deletes) == ([], [], [], [])
+    assert unchanged == 5
+
+
+def test_new_file_is_inserted(campus):
+    database_file, _ = campus
+    sources = {"campus.txt": CAMPUS, "events.txt": EVENTS, "transport.txt": "Buses leave at 9 am."}
+    inserts, updates, moves, deletes, unchanged = plan(database_file, sources)
+    assert [(chunk.source, chunk.offset, chunk.text) for chunk in inserts] == [("transport.txt", 0, "Buses leave at 9 am.")]
+    assert (updates, moves, deletes, unchanged) == ([], [], [], 5)
+
+
+def test_changed_chunk_updates_its_row(campus):
+    database_file, _ = campus
+    changed = CAMPUS.replace("2 pm", "3 pm")
+    inserts, updates, moves, deletes, unchanged = plan(database_file, {"campus.txt": changed, "events.txt": EVENTS})
+    assert inserts == [] and moves == [] and deletes == []
+    assert [(row, chunk.text) for row, chunk in updates] == [
+        (row_id(database_file, "The canteen serves lunch until 2 pm."), "The canteen serves lunch until 3 pm.")
+    ]
+    assert unchanged == 4
+
+
+def test_shifted_chunks_are_moved_not_reembedded(campus):
+    database_file, _ = campus
+    shifted = "Welcome to campus.\n\n" + CAMPUS
+    inserts, updates, moves, deletes, unchanged = plan(database_file, {"campus.txt": shifted, "events.txt": EVENTS})
+    assert [(chunk.offset, chunk.text) for chunk in inserts] == [(0, "Welcome to campus.")]
+    assert updates == [] and deletes == []
+    offset = len("Welcome to campus.\n\n")
+    assert sorted(moves) == sorted([
+        (row_id(database_file, "The library opens at 8 am."), offset),
+        (row_id(database_file, "The canteen serves lunch until 2 pm."), CAMPUS.index("The canteen") + offset),
+        (row_id(database_file, "The gym is next to the hostel."), CAMPUS.index("The gym") + offset),
+    ])
+    assert unchanged == 5
+
+
+def test_removed_text_and_files_are_deleted(campus):
+    database_file, _ = campus
+    trimmed = CAMPUS.replace("\n\nThe gym is next to the hostel.", "")
+    inserts, updates, moves, deletes, unchanged = plan(database_file, {"campus.txt": trimmed})
+    events = [row for (source, _), (row, _) in stored_rows(database_file).items() if source == "events.txt"]
+    assert inserts == [] and updates == [] and moves == []
+    assert sorted(deletes) == sorted(events + [row_id(database_file, "The gym is next to the hostel.")])
+    assert unchanged == 2
+
+
+def test_incremental_ingest_matches_a_full_rebuild(campus):
+    database_file, data_dir = campus
+    (data_dir / "campus.txt").write_text("Welcome to campus.\n\n" + CAMPUS.replace("2 pm", "3 pm"), encoding="utf-8")
+    (data_dir / "events.txt").unlink()
+    (data_dir / "transport.txt").write_text("Buses leave at 9 am.", encoding="utf-8")
+    before = stored_rows(database_file)
+    ingest(database_file, data_dir)
+
+    after = stored_rows(database_file)
+    sources = {path.name: path.read_text(encoding="utf-8") for path in data_dir.glob("*.txt")}
+    expected = {(chunk.source, chunk.offset): chunk.text
+                for source, text in sources.items() for chunk in split_into_chunks(source, text, CHUNKER)}
+    assert {key: content for key, (_, content) in after.items()} == expected
+    # The library paragraph only moved, so it kept its row (and embedding)
+    library = [row for row, content in before.values() if content == "The library opens at 8 am."]
+    assert [row for row, content in after.values() if content == "The library opens at 8 am."] == library
+    # Running again finds nothing to do
+    assert plan(database_file, sources)[:4] == ([], [], [], [])
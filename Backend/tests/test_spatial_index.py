@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from spatial_index import KDTree, SpatialIndex, chord_to_metres, metres_to_chord, to_unit_vectors
+
+
+def brute_force(points, target):
+    """(chord distance, index) of every point, closest first."""
+    return sorted((float(np.linalg.norm(point - target)), i) for i, point in enumerate(points))
+
+
+@pytest.fixture(scope="module")
+def points():
+    # Clustered around a campus, plus points near the poles and the antimeridian
+    rng = np.random.default_rng(5)
+    lat = np.concatenate([8.68 + rng.normal(0, 0.01, 400), rng.uniform(-90, 90, 100), [89.9, -89.9, 0.0, 0.0]])
+    lng = np.concatenate([77.13 + rng.normal(0, 0.01, 400), rng.uniform(-180, 180, 100), [10.0, -170.0, 179.99, -179.99]])
+    return to_unit_vectors(lat, lng)
+
+
+@pytest.mark.parametrize("k", [1, 5, 50, 600])
+def test_nearest_matches_brute_force(points, k):
+    tree = KDTree(points)
+    rng = np.random.default_rng(k)
+    for target in points[rng.choice(len(points), 40)] + rng.normal(0, 1e-4, (40, 3)):
+        expected = brute_force(points, target)[:k]
+        result = tree.nearest(target, k)
+        assert [i for _, i in result] == [i for _, i in expected]
+        assert np.allclose([d for d, _ in result], [d for d, _ in expected])
+
+
+@pytest.mark.parametrize("radius_m", [0.0, 50.0, 500.0, 5000.0, 2e7])
+def test_within_matches_brute_force(points, radius_m):
+    tree = KDTree(points)
+    radius = metres_to_chord(radius_m)
+    for target in points[::25]:
+        expected = [(d, i) for d, i in brute_force(points, target) if d <= radius]
+        assert tree.within(target, radius) == expected
+
+
+def test_empty_tree():
+    tree = KDTree(np.empty((0, 3)))
+    assert tree.nearest(to_unit_vectors(8.68, 77.13), 3) == []
+    assert tree.within(to_unit_vectors(8.68, 77.13), 1.0) == []
+
+
+def test_chord_conversion_round_trips():
+    for metres in [0.0, 1.0, 250.0, 1e5, 1e7]:
+        assert chord_to_metres(metres_to_chord(metres)) == pytest.approx(metres, abs=1e-6)
+
+
+def test_index_searches_by_tag_and_skips_unmapped_buildings():
+    index = SpatialIndex(None)
+    index.index([
+        {"name": "Library", "lat": 8.6800, "lng": 77.1300, "tags": ["library"]},
+        {"name": "Canteen", "lat": 8.6810, "lng": 77.1300, "tags": ["canteen"]},
+        {"name": "Far Canteen", "lat": 8.6900, "lng": 77.1300, "tags": ["canteen"]},
+        {"name": "Not Mapped", "lat": 999.0, "lng": 77.1300, "tags": ["canteen"]},
+    ])
+    assert [b["name"] for b in index.nearest(8.6800, 77.1300, k=5, tag="canteen")] == ["Canteen", "Far Canteen"]
+    assert [b["name"] for b in index.within(8.6800, 77.1300, 200, exclude="Library")] == ["Canteen"]
+    assert index.nearest(8.6800, 77.1300, tag="lab") == []
+    assert index.get("Canteen")["name"] == "Canteen"
+    assert index.get("Not Mapped") is None
@@ -0,0 +1,188 @@
+import os
+import logging
+import json
+import time
+from collections import namedtuple
+import numpy as np
+from db_pool import table_exists
+from embedding_store import blobs_to_matrix, is_legacy_format
+from ann_index import IVFIndex, ann_index_path
+from reloading import ReloadingIndex, file_signature
+from snapshot import MappedTexts
+
+logger = logging.getLogger(__name__)
+
+# Everything a search reads, replaced as one object on reload so concurrent searches (which run on
+# the worker pool) never combine ids, texts, matrix and ANN lists from different builds.
+IndexState = namedtuple("IndexState", ["ids", "contents", "matrix", "ann", "text_bytes", "source"])
+EMPTY_STATE = IndexState(np.empty(0, dtype=np.int64), [], np.empty((0, 0), dtype=np.float32), None, 0, None)
+
+
+class VectorIndex(ReloadingIndex):
+    """
+    In-memory index over the knowledge_base embeddings.
+
+    All embeddings are loaded once into a contiguous, L2-normalised float32 matrix so a
+    query is answered with one matrix-vector product and an argpartition, instead of
+    decoding JSON and computing cosine similarity row by row. The index reloads itself
+    whenever the database file changes on disk (e.g. after re-running ingest_data.py).
+
+    With backend="ivf" the persisted IVF index built by ingest_data.py is attached and
+    queries only scan the closest `nprobe` clusters; it falls back to exact search if the
+    index file is missing or stale.
+
+    When `snapshots` (a SnapshotCache) has a current runtime snapshot, the matrix is memory-mapped from
+    it instead of being decoded from SQLite, and chunk texts are read from the mapping on demand.
+    """
+
+    def __init__(self, database_file, backend="exact", nprobe=4, snapshots=None):
+        if backend not in ("exact", "ivf"):
+            raise ValueError(f"Unknown knowledge index backend '{backend}'.")
+        super().__init__(database_file)
+        self.backend = backend
+        self.nprobe = nprobe
+        self.snapshots = snapshots
+        self._state = EMPTY_STATE
+        self.build_seconds = 0.0
+        self.version = 0  # bumped on every rebuild, so caches derived from the index can invalidate
+
+    @property
+    def ids(self):
+        return self._state.ids
+
+    @property
+    def contents(self):
+        return self._state.contents
+
+    @property
+    def matrix(self):
+        return self._state.matrix
+
+    @property
+    def ann(self):
+        return self._state.ann
+
+    @property
+    def text_bytes(self):
+        return self._state.text_bytes
+
+    @property
+    def source(self):
+        return self._state.source
+
+    # --- Freshness ---
+    def _current_signature(self):
+        signature = file_signature(self.database_file)
+        if signature is not None and self.backend == "ivf":
+            signature += (file_signature(ann_index_path(self.database_file)),)
+        return signature
+
+    def reload(self, conn):
+        """Reloads from the runtime snapshot if a current one exists, else from conn."""
+        snapshot = self.snapshots.get() if self.snapshots is not None else None
+        if snapshot is not None:
+            self.load_snapshot(snapshot)
+        else:
+            self.build(conn)
+
+    # --- Building ---
+    def build(self, conn):
+        """Loads every embedding from knowledge_base into the matrix (and attaches the ANN index)."""
+        start = time.perf_counter()
+        self._install(*load_embeddings(conn), source="database", start=start)
+
+    def load_snapshot(self, snapshot):
+        """Uses the matrix, ids and chunk texts mapped from a runtime snapshot, without copying them."""
+        self._install(snapshot.ids, snapshot.contents, snapshot.matrix, source="snapshot", start=time.perf_counter())
+
+    def _install(self, ids, contents, matrix, source, start):
+        text_bytes = contents.nbytes if isinstance(contents, MappedTexts) else sum(len(c) for c in contents)
+        ann = self._load_ann(ids) if self.backend == "ivf" and len(contents) else None
+        self._state = IndexState(ids, contents, matrix, ann, text_bytes, source)
+        self.version += 1
+        self.build_seconds = time.perf_counter() - start
+        logger.info("Loaded knowledge index", extra={"source": source, "vectors": len(contents),
+                                                     "duration_ms": round(self.build_seconds * 1000, 3),
+                                                     "memory_bytes": self.nbytes})
+
+    def _load_ann(self, ids):
+        path = ann_index_path(self.database_file)
+        if not os.path.exists(path):
+            logger.warning("ANN index not found; falling back to exact search", extra={"path": path})
+            return None
+        ann = IVFIndex.load(path, nprobe=self.nprobe)
+        if not ann.attach(ids):
+            logger.warning("ANN index is stale; falling back to exact search", extra={"path": path})
+            return None
+        return ann
+
+    # --- Querying ---
+    def search(self, query_embedding, top_k=3):
+        """Returns (content, score) pairs for the top_k most similar chunks, best first."""
+        return [(content, score) for _, content, score in self.search_with_ids(query_embedding, top_k)]
+
+    def search_with_ids(self, query_embedding, top_k=3):
+        """Like search(), but returns (knowledge_base row id, content, score) so results can be fused with other rankers."""
+        state = self._state
+        if len(state.contents) == 0 or top_k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+        if state.ann is not None:
+            positions, scores = state.ann.search(state.matrix, query, top_k)
+            return [(int(state.ids[i]), state.contents[i], float(score)) for i, score in zip(positions, scores)]
+
+        scores = state.matrix @ query
+        k = min(top_k, scores.shape[0])
+        if k < scores.shape[0]:
+            candidates = np.argpartition(scores, -k)[-k:]
+        else:
+            candidates = np.arange(scores.shape[0])
+        best = candidates[np.argsort(scores[candidates])[::-1]]
+        return [(int(state.ids[i]), state.contents[i], float(scores[i])) for i in best]
+
+    # --- Introspection ---
+    @property
+    def nbytes(self):
+        state = self._state
+        return int(state.matrix.nbytes + state.ids.nbytes + state.text_bytes)
+
+    def stats(self):
+        state = self._state
+        return {
+            "backend": "ivf" if state.ann is not None else "exact",
+            "source": state.source,
+            "vectors": len(state.contents),
+            "dimension": int(state.matrix.shape[1]) if state.matrix.ndim == 2 and len(state.contents) else 0,
+            "build_ms": round(self.build_seconds * 1000, 3),
+            "memory_bytes": self.nbytes,
+            "ann_lists": state.ann.nlist if state.ann is not None else 0,
+        }
+
+
+def load_embeddings(conn):
+    """Reads knowledge_base as (ids, contents, L2-normalised float32 matrix), in id order."""
+    if not table_exists(conn, "knowledge_base"):
+        return np.empty(0, dtype=np.int64), [], np.empty((0, 0), dtype=np.float32)
+    rows = conn.execute("SELECT id, content, embedding FROM knowledge_base ORDER BY id").fetchall()
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    contents = [row[1] for row in rows]
+    if not rows:
+        matrix = np.empty((0, 0), dtype=np.float32)
+    elif is_legacy_format(conn):
+        logger.warning("knowledge_base stores JSON embeddings. Run 'python embedding_store.py' to migrate.")
+        matrix = normalize_rows(np.array([json.loads(row[2]) for row in rows], dtype=np.float32))
+    else:
+        matrix = normalize_rows(blobs_to_matrix([row[2] for row in rows]).astype(np.float32))
+    return ids, contents, np.ascontiguousarray(matrix)
+
+
+def normalize_rows(matrix):
+    """L2-normalises each row of a float32 matrix in place, leaving zero rows untouched."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
@@ -319,8 +319,8 @@ async function handleQuery(msg) {
 
         const data = await response.json();
         
-        // Always clear the map if the query is for a location or route
-        if (data.type === 'location' || data.type === 'route') {
+        // Always clear the map if the query is for a location, route or nearby places
+        if (data.type === 'location' || data.type === 'route' || data.type === 'nearby') {
             clearMap();
         }
 
@@ -339,6 +339,13 @@ async function handleQuery(msg) {
                 botReplyText = `🗺️ Showing walking route from ${data.from.name} to ${data.to.name}.`;
                 updateMessage(thinkingMsgId, botReplyText);
                 break;
+            case 'nearby':
+                // Mark every match, then the origin last so the map centres on it.
+                data.results.forEach(showLocationMarker);
+                showLocationMarker(data.origin);
+                botReplyText = `📍 ${data.message}`;
+                updateMessage(thinkingMsgId, botReplyText);
+                break;
             case 'greeting':
             case 'answer':
             case 'error':
@@ -217,6 +217,9 @@ async function handleQuery(query) {
             showLocationMarker(data); 
         } else if (data.type === 'route') {
             botResponseText = `Showing route from ${data.from.name} to ${data.to.name}.`;
+        } else if (data.type === 'nearby') {
+            botResponseText = data.message;
+            showLocationMarker(data.origin);
         } else {
             botResponseText = data.message || data.response;
         }